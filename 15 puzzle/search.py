@@ -1,82 +1,82 @@
-import queue
-import time
-import psutil
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from sliding_puzzle.bfs import bidirectional_bfs, breadth_first_search
+from sliding_puzzle.domain import get_puzzle
+from sliding_puzzle.external import external_bfs
+from sliding_puzzle.state import pack
+from sliding_puzzle.stats import SearchStats
+from sliding_puzzle.validate import InvalidBoardError, parse_board, read_board
+
+PUZZLE = get_puzzle(4)
 
 class Search:
 
-    def __init__(self):
-        self.visited = set()
+    # goals: custom goal layout(s) instead of the default one, see sliding_puzzle.domain.goal_layouts
+    def __init__(self, goals=None):
+        self.expanded = 0
+        self.stats = None
+        self.goals = goals
+        self.puzzle = get_puzzle(4, goals=goals)
 
     def goal_test(self, cur_tiles):
-        return cur_tiles == ['1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '11', '12', '13', '14', '15', '0']
+        return pack(cur_tiles) in self.puzzle.goals
 
+    # The target of a move comes from the precomputed move table (see sliding_puzzle.domain),
+    # None if the move would leave the board
     def move_tiles(self, cur_tiles, direction):
         # Find the index of the 0 (empty space) tile
         idx = cur_tiles.index('0')
+        target = PUZZLE.move_target(idx, direction)
+        if target is None:
+            return None
+        # Swap the empty space with the tile at the target
+        new_tiles = cur_tiles.copy()
+        new_tiles[idx], new_tiles[target] = new_tiles[target], new_tiles[idx]
+        return new_tiles
 
-        if direction == 'U':
-            if idx < 4:
-                return None # Cannot move up, return None
-            # Swap the empty space with the tile above it
-            new_tiles = cur_tiles.copy()
-            new_tiles[idx], new_tiles[idx - 4] = new_tiles[idx - 4], new_tiles[idx]
-            return new_tiles
-        
-        if direction == 'D':
-            if idx > 11:
-                return None # Cannot move down, return None
-            # Swap the empty space with the tile below it
-            new_tiles = cur_tiles.copy()
-            new_tiles[idx], new_tiles[idx + 4] = new_tiles[idx + 4], new_tiles[idx]
-            return new_tiles
-
-        if direction == 'L':
-            if idx in [0, 4, 8, 12]:
-                return None # Cannot move left, return None
-            # Swap the empty space with the tile to the left
-            new_tiles = cur_tiles.copy()
-            new_tiles[idx], new_tiles[idx - 1] = new_tiles[idx - 1], new_tiles[idx]
-            return new_tiles
-        
-        if direction == 'R':
-            if idx in [3, 7, 11, 15]:
-                return None # Cannot move right, return None
-            # Swap the empty space with the tile to the right
-            new_tiles = cur_tiles.copy()
-            new_tiles[idx], new_tiles[idx + 1] = new_tiles[idx + 1], new_tiles[idx]
-            return new_tiles
-    
-        return None
 
+    # Breadth first search on the arena node store in sliding_puzzle.bfs: boards are packed
+    # integers (see sliding_puzzle.state) and every node is a row of typed arrays, found again
+    # through its parent index instead of carrying its own list of moves
+    def run_bfs(self, start, stats=None):
+        result = breadth_first_search(pack(start), self.puzzle, stats=stats)
+        if result is None:
+            return None
+        moves, self.expanded, _, _ = result
+        return moves
 
-    def run_bfs(self, start):
-        q = queue.Queue()
-        q.put((start, [])) # (current state, moves to reach this state)
-        self.visited.clear()
-        self.visited.add(tuple(start))
+    # Searches from the start and the goal at the same time, see sliding_puzzle.bfs.
+    # Returns the moves and the number of states reached by both searches
+    def run_bidirectional_bfs(self, start, stats=None):
+        return bidirectional_bfs(pack(start), self.puzzle, stats=stats)
 
-        while not q.empty():
-            cur_tiles, moves = q.get()
-            if self.goal_test(cur_tiles):
-                return moves
-            
-            for direction in ['U', 'D', 'L', 'R']:
-                new_tiles = self.move_tiles(cur_tiles, direction)
-                if new_tiles is not None and tuple(new_tiles) not in self.visited:
-                    q.put((new_tiles, moves + [direction]))
-                    self.visited.add(tuple(new_tiles))
-        return None
+    # Breadth first search with its layers in sorted files under directory instead of a visited
+    # set in RAM, see sliding_puzzle.external. Returns the moves and the number of states reached
+    def run_external_bfs(self, start, directory, stats=None):
+        return external_bfs(pack(start), self.puzzle, directory=directory, stats=stats)
     
-    def solve(self, input): # Format : "1 0 2 4 5 7 3 8 9 6 11 12 13 10 14 15"
-        initial_list = input.split(" ")
-        start_time = time.time()
-        solution_moves = self.run_bfs(initial_list)
-        end_time = time.time()
-        time_taken = end_time - start_time
-        num_expanded_nodes = len(self.visited)
-        process = psutil.Process()
-        memory_info = process.memory_info()
-        max_memory = memory_info.rss
+    # Raises InvalidBoardError / UnsolvableBoardError before searching, see sliding_puzzle.validate.
+    # Only 4x4 boards are accepted, the searches here run on the 15-puzzle tables.
+    # Time and peak memory come from a sliding_puzzle.stats.SearchStats kept in self.stats
+    # external is a directory for the disk-backed search, None to search in memory
+    def solve(self, input, bidirectional=False, external=None): # Format : "1 0 2 4 5 7 3 8 9 6 11 12 13 10 14 15"
+        tiles = parse_board(input)
+        if len(tiles) != self.puzzle.cells:
+            raise InvalidBoardError("board has %d tiles, this solver takes 4x4 boards of %d tiles"
+                                    % (len(tiles), self.puzzle.cells))
+        initial_list = read_board(tiles, goals=self.goals)
+        self.stats = SearchStats().start()
+        if external is not None:
+            solution_moves, num_expanded_nodes = self.run_external_bfs(initial_list, external, self.stats)
+        elif bidirectional:
+            solution_moves, num_expanded_nodes = self.run_bidirectional_bfs(initial_list, self.stats)
+        else:
+            solution_moves = self.run_bfs(initial_list, self.stats)
+            num_expanded_nodes = self.expanded
+        time_taken = self.stats.elapsed
+        max_memory = self.stats.peak_memory
         print("Moves: " + "".join(solution_moves))
         print("Number of expanded Nodes: " + str(num_expanded_nodes))
         print("Time Taken: " + str(time_taken))
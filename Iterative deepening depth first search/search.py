@@ -1,42 +1,64 @@
 import gc
 import random
 import math
-import time
 import psutil
 import os
-from collections import deque
 import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from sliding_puzzle.iddfs import iddfs
+from sliding_puzzle.benchmark import random_walk
+from sliding_puzzle.bfs import breadth_first_search
+from sliding_puzzle.domain import get_puzzle
+from sliding_puzzle.stats import SearchStats
+from sliding_puzzle.validate import is_solvable, read_board
 
-# This class defines the state of the problem in terms of board configuration
+
+# This class defines the state of the problem in terms of board configuration.
+# Tiles are kept packed into one integer with the bits per cell of the board size (see
+# sliding_puzzle.domain) and the empty tile position cached
 class Board:
+    __slots__ = ('size', 'packed', 'blank')
+
     def __init__(self, tiles):
         self.size = int(math.sqrt(len(tiles)))  # defining length/width of the board
-        self.tiles = tiles
-
-    # This function returns the resulting state from taking particular action from current state
+        puzzle = get_puzzle(self.size)
+        self.packed = puzzle.pack(tiles)
+        self.blank = puzzle.find_blank(self.packed)
+
+    @classmethod
+    def from_packed(cls, packed, blank, size):
+        board = cls.__new__(cls)
+        board.size = size
+        board.packed = packed
+        board.blank = blank
+        return board
+
+    @property
+    def tiles(self):
+        return get_puzzle(self.size).unpack(self.packed)
+
+    # This function returns the resulting state from taking particular action from current state,
+    # or None if the action would move the empty tile off the board
     def execute_action(self, action):
-        new_tiles = self.tiles[:]
-        empty_index = new_tiles.index('0')
-        if action == 'L':
-            if empty_index % self.size > 0:
-                new_tiles[empty_index - 1], new_tiles[empty_index] = new_tiles[empty_index], new_tiles[empty_index - 1]
-        if action == 'R':
-            if empty_index % self.size < (self.size - 1):
-                new_tiles[empty_index + 1], new_tiles[empty_index] = new_tiles[empty_index], new_tiles[empty_index + 1]
-        if action == 'U':
-            if empty_index - self.size >= 0:
-                new_tiles[empty_index - self.size], new_tiles[empty_index] = new_tiles[empty_index], new_tiles[
-                    empty_index - self.size]
-        if action == 'D':
-            if empty_index + self.size < self.size * self.size:
-                new_tiles[empty_index + self.size], new_tiles[empty_index] = new_tiles[empty_index], new_tiles[
-                    empty_index + self.size]
-        return Board(new_tiles)
+        puzzle = get_puzzle(self.size)
+        target = puzzle.move_target(self.blank, action)
+        if target is None:
+            return None
+        return Board.from_packed(puzzle.slide(self.packed, self.blank, target), target, self.size)
+
+    # (action, resulting board) for every legal action except the one undoing prev, read from the
+    # precomputed move table of the board size
+    def successors(self, prev=None):
+        puzzle = get_puzzle(self.size)
+        for target, action in puzzle.pruned_moves[self.blank][prev]:
+            yield action, Board.from_packed(puzzle.slide(self.packed, self.blank, target), target, self.size)
 
 
 # This class defines the node on the search tree, consisting of state, parent and previous action
 class Node:
+    __slots__ = ('state', 'parent', 'action')
+
     def __init__(self, state, parent, action):
         self.state = state
         self.parent = parent
@@ -48,27 +70,41 @@ class Node:
 
     # Comparing current node with other node. They are equal if states are equal
     def __eq__(self, other):
-        return self.state.tiles == other.state.tiles
+        return self.state.packed == other.state.packed
 
     def __hash__(self):
-        return hash(tuple(self.state.tiles))
+        return hash(self.state.packed)
 
 
 
 class Search:
 
-    # Utility function to randomly generate 15-puzzle
-    def generate_puzzle(self, size):
+    # goals: custom goal layout(s) instead of the default one, see sliding_puzzle.domain.goal_layouts
+    def __init__(self, goals=None):
+        self.goals = goals
+
+    def puzzle(self, size=4):
+        return get_puzzle(size, goals=self.goals)
+
+    # Utility function to randomly generate 15-puzzle. With walk_length the board is a seeded random
+    # walk of that many moves back from the goal (see sliding_puzzle.benchmark), which controls difficulty
+    def generate_puzzle(self, size, walk_length=None, seed=None):
+        if walk_length is not None:
+            numbers = self.puzzle(size).unpack(random_walk(walk_length, self.puzzle(size), seed))
+            return Node(Board(numbers), None, None)
         numbers = list(range(size * size))
         random.shuffle(numbers)
+        if not is_solvable(numbers, goals=self.goals):
+            # swapping two tiles (not the empty one) moves the board to the other parity class
+            i, j = [k for k, tile in enumerate(numbers) if tile][:2]
+            numbers[i], numbers[j] = numbers[j], numbers[i]
         return Node(Board(numbers), None, None)
 
     # This function returns the list of children obtained after simulating the actions on current node
     def get_children(self, parent_node):
         children = []
-        actions = ['L', 'R', 'U', 'D']  # left,right, up , down ; actions define direction of movement of empty tile
-        for action in actions:
-            child_state = parent_node.state.execute_action(action)
+        # only legal actions are generated; undoing the action that led to the parent is skipped
+        for action, child_state in parent_node.state.successors(parent_node.action):
             child_node = Node(child_state, parent_node, action)
             children.append(child_node)
         return children
@@ -82,97 +118,55 @@ class Search:
         path.reverse()
         return path
 
-    # This function runs breadth first search from the given root node and returns path, number of nodes expanded and total time taken
+    # This function runs breadth first search from the given root node and returns path, number of nodes expanded and total time taken.
+    # The search runs on the arena node store in sliding_puzzle.bfs instead of Node objects
     def run_bfs(self, root_node):
-        start_time = time.time()
-        frontier = deque([root_node])
-        explored = set()
-        max_memory = 0
-        while (len(frontier) > 0):
-            max_memory = max(max_memory, sys.getsizeof(frontier) + sys.getsizeof(explored))
-            cur_time = time.time()
-            cur_node = frontier.popleft()
-            explored.add(cur_node)
-            if (self.goal_test(cur_node.state.tiles)):
-                path = self.find_path(cur_node)
-                end_time = time.time()
-
-                return path, len(explored), (end_time - start_time), max_memory
-            for child in self.get_children(cur_node):
-                if child in explored:
-                    continue
-                else:
-                    frontier.append(child)
-        print("frontier empty")
-        return False
-    
-    def get_all_nodes_at_depth(self, node, depth):
-        if depth == 0:
-            return [node]
-        elif depth > 0:
-            children = self.get_children(node)
-            nodes = []
-            for child in children:
-                nodes += self.get_all_nodes_at_depth(child, depth-1)
-            return nodes
-        else:
-            return []
-
+        result = breadth_first_search(root_node.state.packed, self.puzzle(root_node.state.size))
+        if result is None:
+            print("frontier empty")
+            return False
+        return result
     
-    def run_ids(self,root_node): #Iterative Deepining Search
-        def dls(node, limit): #Depth Limited Search
-            nonlocal expanded_node # Want to use this outside of the nested func
-            if self.goal_test(node.state.tiles):
-                path = self.find_path(node)
-                return path, 0
-            elif limit == 0: #Abort if depth limit reached
-                return False, 0
-            else: 
-                count = 0
-                for child in self.get_children(node):
-                    path, count_ = dls(child, limit - 1) #perform dls recursive
-                    count += count_ #Node Counter
-                    if path:
-                        return path, count + 1
-                    #gc.collect()
-                return False, count + 1 #if no path found
-
-        limit = 1
-        start_time = time.time()
-        expanded_node = 0
-        end_time = time.time()
-        frontier = [root_node]
-        memory_consumed_each_depth = []
-        memory_consumed = 0
-
-        while (end_time := time.time() - start_time) < 30:
-            #memory_consumed = psutil.Process().memory_info().rss
-            memory_consumed = max(memory_consumed, sys.getsizeof(frontier) + sys.getsizeof(expanded_node)) #Calculate memory
-            nodes_at_depth = self.get_all_nodes_at_depth(root_node, limit)
-            memory_consumed_each_depth.append(sum(sys.getsizeof(n) for n in nodes_at_depth))
-            path, count = dls(root_node, limit) #perform dls
-            expanded_node += count #Node Counter
-            if path: #return path if solution
-                return path, expanded_node, end_time, memory_consumed, memory_consumed_each_depth
-            limit += 1
-            frontier = self.get_all_nodes_at_depth(root_node, limit)
-
-        return None, None, None, None, None
+    # Iterative deepening search on the generator based engine in sliding_puzzle.iddfs: only legal moves
+    # that do not undo the previous one are generated and memory is sampled from the live search stack.
+    # table is an optional sliding_puzzle.transposition.TranspositionTable: states already searched
+    # from the same or a smaller depth in this iteration are skipped.
+    # The last value returned is the per depth statistics (nodes, nodes per level, branching factor, memory).
+    # time_limit and node_limit are the budget of this call; with a checkpoint path an unfinished search
+    # is saved there and the next call with the same path resumes it (see sliding_puzzle.checkpoint)
+    def run_ids(self,root_node, table=None, time_limit=30, stats=None, node_limit=None, checkpoint=None): #Iterative Deepining Search
+        board = root_node.state
+        result = iddfs(board.packed, self.puzzle(board.size), node_limit=node_limit, time_limit=time_limit, table=table, stats=stats,
+                       checkpoint=checkpoint)
+        if result is None:
+            return None, None, None, None, None
+        path, expanded_node, time_taken, memory_consumed, depth_stats = result
+        return path, expanded_node, time_taken, memory_consumed, depth_stats
 
 
     def goal_test(self, cur_tiles):
-        return cur_tiles == ['1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '11', '12', '13', '14', '15', '0']
+        puzzle = self.puzzle(int(math.sqrt(len(cur_tiles))))
+        return puzzle.pack(cur_tiles) in puzzle.goals
 
-    def solve(self, input):
+    # Raises InvalidBoardError / UnsolvableBoardError before searching, see sliding_puzzle.validate.
+    # Time and peak memory come from a sliding_puzzle.stats.SearchStats kept in self.stats
+    def solve(self, input, time_limit=30, node_limit=None, checkpoint=None):
 
-        initial_list = input.split(" ")
+        initial_list = read_board(input, goals=self.goals)
         root = Node(Board(initial_list), None, None)
-        path, expanded_nodes, time_taken, memory_consumed, memory_consumed_each_depth = self.run_ids(root)
+        self.stats = SearchStats().start()
+        path, expanded_nodes, _, _, memory_consumed_each_depth = self.run_ids(root, None, time_limit, self.stats,
+                                                                               node_limit, checkpoint)
+        if path is None:
+            print("solution not found")
+            return None
+        time_taken = self.stats.elapsed
+        memory_consumed = self.stats.peak_memory
         print("Moves: " + " ".join(path))
         print("Number of expanded Nodes: " + str(expanded_nodes))
         print("Time Taken: " + str(time_taken))
         print("Max Memory (Bytes): " + str(memory_consumed))
-        #print("Memory Consumed at Each Depth (Bytes): " + str(memory_consumed_each_depth))
+        #print("Memory Consumed at Each Depth (Bytes): " + str([depth["memory"] for depth in memory_consumed_each_depth]))
         return "".join(path)
 
 if __name__ == '__main__':
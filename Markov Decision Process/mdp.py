@@ -1,5 +1,132 @@
+import argparse
+import contextlib
 import copy
+import csv
+import heapq
 import random
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import scipy.sparse
+    import scipy.sparse.linalg
+except ImportError:
+    scipy = None
+
+# policy evaluation modes of policy_iter: `sweeps` Bellman sweeps per improvement
+# (modified policy iteration, one sweep is the classic behaviour of this script) or an
+# exact sparse linear solve (needs numpy and scipy). Undiscounted, a policy that can loop
+# forever without reaching a terminal has no finite values; such policies get the sweeps.
+EVALUATIONS = ('modified', 'exact')
+
+# With exact evaluation a policy only switches to an action that is better by more than
+# this (relative to the current Q value): solved values of tied actions differ in the last
+# bits and would otherwise swap back and forth forever.
+IMPROVEMENT_TOLERANCE = 1e-12
+
+# Iteration counts and wall time per phase of one solver run
+class SolverStats:
+    def __init__(self, method):
+        self.method = method
+        self.iterations = 0
+        self.sweeps = 0
+        self.solves = 0
+        self.backups = 0
+        self.phases = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    @property
+    def elapsed(self):
+        return sum(self.phases.values())
+
+    def __str__(self):
+        phases = ', '.join('%s %.4fs' % item for item in self.phases.items())
+        return '%s: %d iterations, %d backups, %d evaluation sweeps, %d linear solves, %.4fs (%s)' % (
+            self.method, self.iterations, self.backups, self.sweeps, self.solves, self.elapsed, phases)
+
+# Trace of a solver run. record() is called once per iteration (per backup for prioritized
+# sweeping, per improvement step for policy iteration) with its residual: the largest value
+# change of the sweep, the Bellman error backed up, or the number of states whose action
+# changed. The residual goes to callback(iteration, residual), every snapshot_every-th value
+# list is kept, and with display on the grids are printed the way this script always has.
+# With display off nothing is printed; the final values and policy stay on the history and
+# save() writes them in bulk.
+class History:
+    def __init__(self, mdp, display=True, callback=None, snapshot_every=None):
+        self.mdp = mdp
+        self.display = display
+        self.callback = callback
+        self.snapshot_every = snapshot_every
+        self.iterations = []
+        self.residuals = []
+        self.snapshots = [] # (iteration, values by state)
+        self.values = None
+        self.policy = None
+
+    def start(self, V, show=True):
+        if self.snapshot_every:
+            self.snapshots.append((0, value_list(V)))
+        if self.display and show:
+            print("Iteration :", 0)
+            display_grid(self.mdp.to_grid(V), self.mdp)
+
+    def record(self, iteration, residual, V, show=True):
+        residual = float(residual)
+        self.iterations.append(iteration)
+        self.residuals.append(residual)
+        if self.callback is not None:
+            self.callback(iteration, residual)
+        if self.snapshot_every and iteration % self.snapshot_every == 0:
+            self.snapshots.append((iteration, value_list(V)))
+        if self.display and show:
+            print("Iteration :", iteration)
+            display_grid(self.mdp.to_grid(V), self.mdp)
+
+    def finish(self, V, policy, show=True):
+        self.values = value_list(V)
+        self.policy = policy
+        if self.display and show:
+            print("Final Value after Convergence")
+            display_grid(self.mdp.to_grid(self.values), self.mdp)
+
+    # Writes <prefix>values (the final value grid), <prefix>residuals (iteration, residual
+    # rows) and, if any were kept, <prefix>snapshots (one row per snapshot: the iteration, then
+    # every cell in row-major order) as .npy or .csv files
+    def save(self, prefix, fmt='npy'):
+        mdp = self.mdp
+        write_table('%svalues.%s' % (prefix, fmt), mdp.to_grid(self.values))
+        write_table('%sresiduals.%s' % (prefix, fmt), list(zip(self.iterations, self.residuals)))
+        if self.snapshots:
+            write_table('%ssnapshots.%s' % (prefix, fmt),
+                        [[iteration] + [None if mdp.wall_mask[s] else v for s, v in enumerate(values)]
+                         for iteration, values in self.snapshots])
+
+# Copy of a value list or array as a list of floats
+def value_list(V):
+    return V.tolist() if np is not None and isinstance(V, np.ndarray) else list(V)
+
+# Rows of numbers written in one go: .npy (None becomes nan, needs numpy) or CSV (None
+# becomes an empty field)
+def write_table(path, rows):
+    if path.endswith('.npy'):
+        if np is None:
+            raise ImportError("writing .npy files needs numpy")
+        np.save(path, np.array([[np.nan if v is None else v for v in row] for row in rows], dtype=float))
+    else:
+        with open(path, 'w', newline='') as f:
+            csv.writer(f).writerows([['' if v is None else str(v) for v in row] for row in rows])
 
 class MarkovDP:
     def __init__(self, x, y, walls, terminals, reward, trans_probs, epsilon, discount_factor):
@@ -25,14 +152,35 @@ class MarkovDP:
         self.epsilon = epsilon
         self.discount = discount_factor
 
+        # state index: cell [x, y] (row x, column y) is state x * x_max + y
+        self.states = tuple((x, y) for x in range(self.y_max) for y in range(self.x_max))
+        self.actions = tuple(self.action_space())
+        self.action_index = {action: i for i, action in enumerate(self.actions)}
+        wall_mask = [False] * len(self.states)
+        terminal_mask = [False] * len(self.states)
+        for x, y in self.wall_locs:
+            wall_mask[self.state_of(x, y)] = True
+        for x, y in self.terminals:
+            terminal_mask[self.state_of(x, y)] = True
+        self.wall_mask = tuple(wall_mask)
+        self.terminal_mask = tuple(terminal_mask)
+        # what is_terminal tests: terminals and walls are never backed up
+        self.blocked = tuple(w or t for w, t in zip(wall_mask, terminal_mask))
+        self.free_states = tuple(s for s, blocked in enumerate(self.blocked) if not blocked)
+        self._successors = None
+        self._predecessors = None
+
+    def state_of(self, x, y):
+        return x * self.x_max + y
+
     def valid_action(self, x, y, a):
-        if a == "N" and x - 1 >= 0 and [x - 1, y] not in self.wall_locs:
+        if a == "N" and x - 1 >= 0 and not self.wall_mask[self.state_of(x - 1, y)]:
             return [x - 1, y]
-        elif a == "S" and x + 1 < self.y_max and [x + 1, y] not in self.wall_locs:
+        elif a == "S" and x + 1 < self.y_max and not self.wall_mask[self.state_of(x + 1, y)]:
             return [x + 1, y]
-        elif a == "E" and y + 1 < self.x_max and [x, y + 1] not in self.wall_locs:
+        elif a == "E" and y + 1 < self.x_max and not self.wall_mask[self.state_of(x, y + 1)]:
             return [x, y + 1]
-        elif a == "W" and y - 1 >= 0 and [x, y - 1] not in self.wall_locs:
+        elif a == "W" and y - 1 >= 0 and not self.wall_mask[self.state_of(x, y - 1)]:
             return [x, y - 1]
         else:
             return [x, y]
@@ -41,7 +189,7 @@ class MarkovDP:
         return ["E", "N", "W", "S"]
 
     def is_terminal(self, x, y):
-        return [x, y] in self.terminals or [x, y] in self.wall_locs
+        return self.blocked[self.state_of(x, y)]
 
     def transition(self, x, y, a):
         directions = ["E", "N", "W", "S"]
@@ -56,75 +204,514 @@ class MarkovDP:
 
         return result
 
-    
+    # successors[state][action index] is ((next state, probability), ...): the outcomes of
+    # transition() with the ones landing on the same cell merged (probabilities added in
+    # turn order) and impossible ones dropped. Built on first use, then shared by all solvers.
+    @property
+    def successors(self):
+        if self._successors is None:
+            table = []
+            for x, y in self.states:
+                row = []
+                for action in self.actions:
+                    merged = {}
+                    for (next_x, next_y), prob in zip(self.transition(x, y, action), self.transition_probs):
+                        if prob:
+                            next_state = self.state_of(next_x, next_y)
+                            merged[next_state] = merged.get(next_state, 0) + prob
+                    row.append(tuple(merged.items()))
+                table.append(tuple(row))
+            self._successors = tuple(table)
+        return self._successors
+
+    # predecessors[state] is the free states with some action that can land in state, i.e.
+    # the states whose Q values change when the value of state does
+    @property
+    def predecessors(self):
+        if self._predecessors is None:
+            table = [set() for _ in self.states]
+            for s in self.free_states:
+                for outcomes in self.successors[s]:
+                    for next_state, _ in outcomes:
+                        table[next_state].add(s)
+            self._predecessors = tuple(tuple(sorted(states)) for states in table)
+        return self._predecessors
+
+    # The term q_value adds for landing in each state: the terminal value, or the reward plus
+    # the discounted value (every non-terminal cell has the same reward)
+    def backup_values(self, V):
+        grid = self.grid
+        return [grid[x][y] if blocked else self.reward + self.discount * v
+                for (x, y), blocked, v in zip(self.states, self.blocked, V)]
+
+    def to_grid(self, V):
+        return [[None if self.wall_mask[s] else V[s] for s in range(x * self.x_max, (x + 1) * self.x_max)]
+                for x in range(self.y_max)]
 
-def value_iter(mdp):
+    # Policy grid like mdp.state with the action letters of choice (action indices) filled in
+    def policy_grid(self, choice):
+        policy = copy.deepcopy(self.state)
+        for s in self.free_states:
+            x, y = self.states[s]
+            policy[x][y] = self.actions[choice[s]]
+        return policy
+
+    def from_grid(self, grid):
+        return [0 if item is None else item for row in grid for item in row]
+
+# Q value of every action of state s, W from mdp.backup_values
+def q_values(mdp, s, W):
+    return [sum(prob * W[next_state] for next_state, prob in outcomes) for outcomes in mdp.successors[s]]
+
+# Action with the largest Q value; ties go to the latest action letter, as max((q, action)) does
+def best_action(mdp, q):
+    return max(zip(q, mdp.actions))[1]
+
+# Greedy policy grid for the values V
+def greedy_policy(mdp, V):
+    W = mdp.backup_values(V)
+    choice = [None] * len(mdp.states)
+    for s in mdp.free_states:
+        choice[s] = mdp.action_index[best_action(mdp, q_values(mdp, s, W))]
+    return mdp.policy_grid(choice)
+
+# Value iteration stops once no state changes by more than this in a sweep
+def stop_threshold(mdp):
+    return mdp.epsilon * (1 - mdp.discount) / mdp.discount
+
+# Synchronous (Jacobi) value iteration: every sweep backs up all states from the values of
+# the previous one
+def value_iter(mdp, stats=None, history=None):
+    if stats is None:
+        stats = SolverStats('value iteration')
+    if history is None:
+        history = History(mdp)
     iteration = 0
-    V = mdp.state
-    print("Iteration :", iteration)
-    display_grid(V, mdp)
+    V = mdp.from_grid(mdp.state)
+    history.start(V)
     while True:
         iteration += 1
-        new_V = copy.deepcopy(V)
-        for x, row in enumerate(V):
-            for y, item in enumerate(row):
-                if not mdp.is_terminal(x, y):
-                    new_V[x][y] = max(q_value(mdp, x, y, action, V) for action in mdp.action_space())
-
-        max_diff = max(abs(V[x][y] - new_V[x][y]) for x, row in enumerate(V) for y, item in enumerate(row) if not mdp.is_terminal(x, y))
-        if max_diff <= (mdp.epsilon * (1 - mdp.discount) / mdp.discount):
+        with stats.phase('sweep'):
+            new_V = V[:]
+            W = mdp.backup_values(V)
+            for s in mdp.free_states:
+                new_V[s] = max(q_values(mdp, s, W))
+            max_diff = max((abs(V[s] - new_V[s]) for s in mdp.free_states), default=0)
+        stats.iterations = iteration
+        stats.backups += len(mdp.free_states)
+        converged = max_diff <= stop_threshold(mdp)
+        history.record(iteration, max_diff, new_V, show=not converged)
+        if converged:
             break
-        print("Iteration :", iteration)
-        display_grid(new_V, mdp)
         V = new_V
 
-    optimal_policy = copy.deepcopy(V)
-    for x, row in enumerate(V):
-        for y, item in enumerate(row):
-            if not mdp.is_terminal(x, y):
-                optimal_policy[x][y] = max((q_value(mdp, x, y, action, V), action) for action in mdp.action_space())[1]
+    with stats.phase('policy'):
+        optimal_policy = greedy_policy(mdp, V)
 
-    print("Final Value after Convergence")
-    display_grid(new_V, mdp)
+    history.finish(new_V, optimal_policy)
     return optimal_policy
 
-def policy_eval(policy, U, mdp):
-    new_U = copy.deepcopy(U)
-    for x, row in enumerate(new_U):
-        for y, item in enumerate(row):
-            if not mdp.is_terminal(x, y):
-                new_U[x][y] = q_value(mdp, x, y, policy[x][y], U)
+# In-place (Gauss-Seidel) value iteration: one value list, every backup already sees the
+# states updated before it in the sweep
+def value_iter_gauss_seidel(mdp, stats=None, history=None):
+    if stats is None:
+        stats = SolverStats('value iteration (gauss-seidel)')
+    if history is None:
+        history = History(mdp)
+    iteration = 0
+    V = mdp.from_grid(mdp.state)
+    W = mdp.backup_values(V)
+    reward, discount = mdp.reward, mdp.discount
+    history.start(V)
+    while True:
+        iteration += 1
+        max_diff = 0
+        with stats.phase('sweep'):
+            for s in mdp.free_states:
+                value = max(q_values(mdp, s, W))
+                diff = abs(value - V[s])
+                if diff > max_diff:
+                    max_diff = diff
+                V[s] = value
+                W[s] = reward + discount * value
+        stats.iterations = iteration
+        stats.backups += len(mdp.free_states)
+        converged = max_diff <= stop_threshold(mdp)
+        history.record(iteration, max_diff, V, show=not converged)
+        if converged:
+            break
+
+    with stats.phase('policy'):
+        optimal_policy = greedy_policy(mdp, V)
+
+    history.finish(V, optimal_policy)
+    return optimal_policy
+
+# Prioritized sweeping: a heap of states keyed by their Bellman error |max Q - V|. The state
+# with the largest error is backed up, then the errors of its predecessors are refreshed, until
+# no error is above the stop threshold. Heap entries whose error is no longer the state's
+# current one are skipped when popped. Only the start and the converged values are printed.
+def value_iter_prioritized(mdp, stats=None, history=None):
+    if stats is None:
+        stats = SolverStats('value iteration (prioritized)')
+    if history is None:
+        history = History(mdp)
+    V = mdp.from_grid(mdp.state)
+    W = mdp.backup_values(V)
+    reward, discount = mdp.reward, mdp.discount
+    threshold = stop_threshold(mdp)
+    predecessors = mdp.predecessors
+    history.start(V)
+
+    with stats.phase('sweep'):
+        errors = [0.0] * len(mdp.states)
+        heap = []
+        for s in mdp.free_states:
+            error = abs(max(q_values(mdp, s, W)) - V[s])
+            if error > threshold:
+                errors[s] = error
+                heap.append((-error, s))
+        heapq.heapify(heap)
+        while heap:
+            error, s = heapq.heappop(heap)
+            if -error != errors[s]:
+                continue
+            value = max(q_values(mdp, s, W))
+            V[s] = value
+            W[s] = reward + discount * value
+            errors[s] = 0.0
+            stats.backups += 1
+            history.record(stats.backups, -error, V, show=False)
+            for p in predecessors[s]:
+                error = abs(max(q_values(mdp, p, W)) - V[p])
+                if error > threshold:
+                    if error != errors[p]:
+                        errors[p] = error
+                        heapq.heappush(heap, (-error, p))
+                else:
+                    errors[p] = 0.0
+        stats.iterations = stats.backups
+
+    with stats.phase('policy'):
+        optimal_policy = greedy_policy(mdp, V)
+
+    history.finish(V, optimal_policy)
+    return optimal_policy
+
+# value iteration variants of mdp.py --method
+VALUE_METHODS = {
+    'jacobi': value_iter,
+    'gauss-seidel': value_iter_gauss_seidel,
+    'prioritized': value_iter_prioritized,
+}
+
+# The gridworld compiled into arrays over the states (needs numpy).
+# moves[h] is the state reached by heading h from every state (the state itself when
+# blocked) and outcomes[a] lists the (heading, probabilities) of the four turns of action
+# a, so the transition tensor is a probability mix of four gathers. The probabilities are
+# per state and follow MarkovDP.successors: a turn landing where an earlier one did gets 0
+# and its probability is added to the earlier one. As in MarkovDP.backup_values the term
+# added for a successor depends on the successor alone.
+class ArrayModel:
+    def __init__(self, mdp):
+        if np is None:
+            raise ImportError("the numpy backend needs numpy")
+        rows, cols = mdp.y_max, mdp.x_max
+        n = rows * cols
+        self.shape = (rows, cols)
+        self.actions = mdp.action_space()
+        self.reward = mdp.reward
+        self.discount = mdp.discount
+        wall = np.array(mdp.wall_mask, dtype=bool)
+        self.terminal = np.array(mdp.blocked, dtype=bool)
+        self.values = np.zeros(n)
+        for x, y in mdp.terminals:
+            self.values[mdp.state_of(x, y)] = mdp.grid[x][y]
+        self.free = ~self.terminal
+
+        cell = np.arange(n)
+        x, y = cell // cols, cell % cols
+        self.moves = {}
+        for heading, (dx, dy) in {"E": (0, 1), "N": (-1, 0), "W": (0, -1), "S": (1, 0)}.items():
+            inside = (x + dx >= 0) & (x + dx < rows) & (y + dy >= 0) & (y + dy < cols)
+            target = np.where(inside, cell + dx * cols + dy, cell)
+            self.moves[heading] = np.where(inside & ~wall[target], target, cell).astype(np.int32)
+        self.outcomes = {}
+        for action in self.actions:
+            headings = [self.actions[(self.actions.index(action) + turn) % 4] for turn in (0, +1, -1, +2)]
+            targets = [self.moves[heading] for heading in headings]
+            probs = mdp.transition_probs
+            outcomes = []
+            for i, heading in enumerate(headings):
+                if not probs[i]:
+                    continue
+                first = np.ones(n, dtype=bool)
+                for k in range(i):
+                    if probs[k]:
+                        first &= targets[k] != targets[i]
+                merged = np.full(n, 0.0) + probs[i]
+                for j in range(i + 1, len(headings)):
+                    if probs[j]:
+                        merged = np.where(targets[j] == targets[i], merged + probs[j], merged)
+                outcomes.append((heading, np.where(first, merged, 0.0)))
+            self.outcomes[action] = outcomes
+
+    def backup_values(self, V):
+        return np.where(self.terminal, self.values, self.reward + self.discount * V)
+
+    # Q values of every state, one row per action in action_space() order; the terms are
+    # added in the same order as q_values, so the values are identical
+    def q_values(self, V):
+        W = self.backup_values(V)
+        gathered = {heading: W[target] for heading, target in self.moves.items()}
+        Q = np.zeros((len(self.actions), len(V)))
+        for a, action in enumerate(self.actions):
+            for heading, prob in self.outcomes[action]:
+                Q[a] += prob * gathered[heading]
+        return Q
+
+    # Best action per cell; ties go to the latest action letter, as with max((q, action))
+    def greedy(self, Q):
+        order = sorted(range(len(self.actions)), key=lambda a: self.actions[a], reverse=True)
+        best = np.argmax(Q[order], axis=0)
+        return np.array(order)[best]
+
+    # Values of one Bellman sweep under a policy (action index per state)
+    def policy_values(self, V, choice):
+        return self.q_values(V)[choice, np.arange(len(V))]
+
+    # Exact values of a policy: (I - discount * P) U = b over the free states, where P moves
+    # between free states under the policy and b collects the rewards and terminal values
+    def solve_policy(self, choice):
+        if scipy is None:
+            raise ImportError("exact policy evaluation needs scipy")
+        n = len(self.free)
+        free = np.flatnonzero(self.free)
+        position = np.full(n, -1)
+        position[free] = np.arange(len(free))
+        b = np.zeros(len(free))
+        rows, cols, data = [np.arange(len(free))], [np.arange(len(free))], [np.ones(len(free))]
+        for a, action in enumerate(self.actions):
+            states = free[choice[free] == a]
+            for heading, probs in self.outcomes[action]:
+                prob = probs[states]
+                next_states = self.moves[heading][states]
+                ends = self.terminal[next_states]
+                b[position[states]] += np.where(ends, prob * self.values[next_states], prob * self.reward)
+                keep = ~ends & (prob != 0)
+                rows.append(position[states[keep]])
+                cols.append(position[next_states[keep]])
+                data.append(-self.discount * prob[keep])
+        A = scipy.sparse.csc_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                                    shape=(len(free), len(free)))
+        U = np.zeros(n)
+        if len(free):
+            U[free] = scipy.sparse.linalg.spsolve(A, b)
+        return U
+
+    def to_grid(self, V):
+        return V.reshape(self.shape).tolist()
+
+    def to_policy(self, choice, mdp):
+        policy = [row[:] for row in mdp.state]
+        cols = self.shape[1]
+        for i in np.flatnonzero(self.free).tolist():
+            policy[i // cols][i % cols] = self.actions[choice[i]]
+        return policy
+
+# value_iter on the ArrayModel: every sweep is a few array operations, same output
+def value_iter_numpy(mdp, stats=None, history=None):
+    if stats is None:
+        stats = SolverStats('value iteration (numpy)')
+    if history is None:
+        history = History(mdp)
+    with stats.phase('compile'):
+        model = ArrayModel(mdp)
+    free = model.free
+    iteration = 0
+    V = np.zeros(len(free))
+    history.start(V)
+    while True:
+        iteration += 1
+        with stats.phase('sweep'):
+            new_V = np.where(free, model.q_values(V).max(axis=0), V)
+            max_diff = np.abs(V - new_V)[free].max() if free.any() else 0.0
+        stats.iterations = iteration
+        stats.backups += int(free.sum())
+        converged = max_diff <= stop_threshold(mdp)
+        history.record(iteration, max_diff, new_V, show=not converged)
+        if converged:
+            break
+        V = new_V
+
+    with stats.phase('policy'):
+        optimal_policy = model.to_policy(model.greedy(model.q_values(V)), mdp)
+    history.finish(new_V, optimal_policy)
+    return optimal_policy
+
+# Value iteration without any printing: (value grid, policy grid, History). callback and
+# snapshot_every are passed to the History.
+def solve(mdp, method='jacobi', backend='python', callback=None, snapshot_every=None, stats=None):
+    history = History(mdp, display=False, callback=callback, snapshot_every=snapshot_every)
+    if backend == 'numpy':
+        if method != 'jacobi':
+            raise ValueError("the numpy backend only runs jacobi value iteration")
+        solver = value_iter_numpy
+    else:
+        solver = VALUE_METHODS[method]
+    policy = solver(mdp, stats, history)
+    return mdp.to_grid(history.values), policy, history
+
+# One Bellman sweep under a policy given as an action index per state
+def policy_sweep(mdp, choice, U):
+    new_U = U[:]
+    W = mdp.backup_values(U)
+    successors = mdp.successors
+    for s in mdp.free_states:
+        new_U[s] = sum(prob * W[next_state] for next_state, prob in successors[s][choice[s]])
     return new_U
 
+def policy_eval(policy, U, mdp):
+    choice = [None if mdp.blocked[s] else mdp.action_index[policy[x][y]] for s, (x, y) in enumerate(mdp.states)]
+    return mdp.to_grid(policy_sweep(mdp, choice, mdp.from_grid(U)))
+
+# Whether the exact values of a policy exist: with discount < 1 always, undiscounted only
+# if every free state can reach a terminal under the policy
+def solvable(mdp, choice):
+    if mdp.discount < 1:
+        return True
+    predecessors = [[] for _ in mdp.states]
+    for s in mdp.free_states:
+        for next_state, _ in mdp.successors[s][choice[s]]:
+            predecessors[next_state].append(s)
+    seen = set()
+    stack = [s for s in range(len(mdp.states)) if mdp.terminal_mask[s]]
+    while stack:
+        for s in predecessors[stack.pop()]:
+            if s not in seen:
+                seen.add(s)
+                stack.append(s)
+    return len(seen) == len(mdp.free_states)
+
+# Exact values of a policy, see ArrayModel.solve_policy
+def solve_policy(mdp, choice):
+    if scipy is None:
+        raise ImportError("exact policy evaluation needs scipy")
+    free = mdp.free_states
+    position = {s: i for i, s in enumerate(free)}
+    b = [0.0] * len(free)
+    rows, cols, data = list(range(len(free))), list(range(len(free))), [1.0] * len(free)
+    for i, s in enumerate(free):
+        for next_state, prob in mdp.successors[s][choice[s]]:
+            if mdp.blocked[next_state]:
+                x, y = mdp.states[next_state]
+                b[i] += prob * mdp.grid[x][y]
+            else:
+                b[i] += prob * mdp.reward
+                rows.append(i)
+                cols.append(position[next_state])
+                data.append(-mdp.discount * prob)
+    U = [0] * len(mdp.states)
+    if free:
+        A = scipy.sparse.csc_matrix((data, (rows, cols)), shape=(len(free), len(free)))
+        for s, u in zip(free, scipy.sparse.linalg.spsolve(A, np.array(b)).tolist()):
+            U[s] = u
+    return U
+
 def q_value(mdp, x, y, action, V):
-    transition_states = mdp.transition(x, y, action)
-    probs = mdp.transition_probs
-    total = sum(probs[i] * (mdp.grid[item[0]][item[1]] if mdp.is_terminal(item[0], item[1]) else (mdp.grid[x][y] + mdp.discount * V[item[0]][item[1]])) for i, item in enumerate(transition_states))
+    outcomes = mdp.successors[mdp.state_of(x, y)][mdp.action_index[action]]
+    total = 0
+    for next_state, prob in outcomes:
+        next_x, next_y = mdp.states[next_state]
+        if mdp.blocked[next_state]:
+            total += prob * mdp.grid[next_x][next_y]
+        else:
+            total += prob * (mdp.grid[x][y] + mdp.discount * V[next_x][next_y])
     return total
 
 
-def policy_iter(mdp):
-    policy = copy.deepcopy(mdp.state)
-    U = copy.deepcopy(mdp.state)
-    for x, row in enumerate(policy):
-        for y, item in enumerate(row):
-            if not mdp.is_terminal(x, y):
-                policy[x][y] = random.choice(mdp.action_space())
-                
+# Policy iteration from a random policy. Every improvement step computes the Q values of a
+# state once and switches to the best action only if it is strictly better.
+def policy_iter(mdp, evaluation='modified', sweeps=1, stats=None, history=None):
+    if evaluation not in EVALUATIONS:
+        raise ValueError("unknown evaluation %r, expected one of %s" % (evaluation, ', '.join(EVALUATIONS)))
+    if stats is None:
+        stats = SolverStats('policy iteration')
+    if history is None:
+        history = History(mdp)
+    tolerance = IMPROVEMENT_TOLERANCE if evaluation == 'exact' else 0.0
+    choice = [None] * len(mdp.states)
+    for s in mdp.free_states:
+        choice[s] = mdp.action_index[random.choice(mdp.action_space())]
+    U = mdp.from_grid(mdp.state)
+    history.start(U, show=False)
 
     while True:
-        U = policy_eval(policy, U, mdp)
-        unchanged = True
-        for x, row in enumerate(U):
-            for y, item in enumerate(row):
-                if not mdp.is_terminal(x, y):
-                    best_action = max((q_value(mdp, x, y, action, U), action) for action in mdp.action_space())[1]
-                    if q_value(mdp, x, y, best_action, U) > q_value(mdp, x, y, policy[x][y], U):
-                        unchanged = False
-                        policy[x][y] = best_action
-        if unchanged:
+        stats.iterations += 1
+        with stats.phase('evaluation'):
+            if evaluation == 'exact' and solvable(mdp, choice):
+                U = solve_policy(mdp, choice)
+                stats.solves += 1
+            else:
+                for _ in range(sweeps):
+                    U = policy_sweep(mdp, choice, U)
+                stats.sweeps += sweeps
+        changed = 0
+        with stats.phase('improvement'):
+            W = mdp.backup_values(U)
+            for s in mdp.free_states:
+                q = q_values(mdp, s, W)
+                best = mdp.action_index[best_action(mdp, q)]
+                if q[best] - q[choice[s]] > tolerance * max(1.0, abs(q[choice[s]])):
+                    changed += 1
+                    choice[s] = best
+        history.record(stats.iterations, changed, U, show=False)
+        if not changed:
+            policy = mdp.policy_grid(choice)
+            history.finish(U, policy, show=False)
             return policy
-                    
+
+# policy_iter on the ArrayModel
+def policy_iter_numpy(mdp, evaluation='modified', sweeps=1, stats=None, history=None):
+    if evaluation not in EVALUATIONS:
+        raise ValueError("unknown evaluation %r, expected one of %s" % (evaluation, ', '.join(EVALUATIONS)))
+    if stats is None:
+        stats = SolverStats('policy iteration (numpy)')
+    if history is None:
+        history = History(mdp)
+    tolerance = IMPROVEMENT_TOLERANCE if evaluation == 'exact' else 0.0
+    with stats.phase('compile'):
+        model = ArrayModel(mdp)
+    free = model.free
+    states = np.arange(len(free))
+    choice = np.zeros(len(free), dtype=np.intp)
+    choice[free] = [mdp.action_index[random.choice(mdp.action_space())] for _ in mdp.free_states]
+    U = np.zeros(len(free))
+    history.start(U, show=False)
+
+    while True:
+        stats.iterations += 1
+        with stats.phase('evaluation'):
+            if evaluation == 'exact' and solvable(mdp, choice.tolist()):
+                U = model.solve_policy(choice)
+                stats.solves += 1
+            else:
+                for _ in range(sweeps):
+                    U = np.where(free, model.policy_values(U, choice), U)
+                stats.sweeps += sweeps
+        with stats.phase('improvement'):
+            Q = model.q_values(U)
+            best = model.greedy(Q)
+            current = Q[choice, states]
+            better = free & (Q[best, states] - current > tolerance * np.maximum(1.0, np.abs(current)))
+            choice = np.where(better, best, choice)
+        changed = int(better.sum())
+        history.record(stats.iterations, changed, U, show=False)
+        if not changed:
+            policy = model.to_policy(choice, mdp)
+            history.finish(U, policy, show=False)
+            return policy
+
 def parse_input(lines):
     params = {}
     for line in lines:
@@ -148,28 +735,29 @@ def parse_input(lines):
                 params['epsilon'] = float(value)
     return params
 
+# The grid is formatted first and printed with one write
 def display_grid(grid, mdp):
+    lines = []
     for row_idx, row in enumerate(grid):
-        line = ''
+        cells = []
         for col_idx, item in enumerate(row):
-            if [row_idx, col_idx] in mdp.wall_locs:
-                line += '--------------'
+            if mdp.wall_mask[mdp.state_of(row_idx, col_idx)]:
+                cells.append('--------------  ')
             elif isinstance(item, (int, float)):
-                line += '%.12f' % item
+                cells.append('%.12f  ' % item)
             else:
-                line += '%s' % item
-            line += '  '
-        print(line)
-    print()
+                cells.append('%s  ' % item)
+        lines.append(''.join(cells) + '\n')
+    print(''.join(lines))
 
 
 def display_policy(policy, mdp):
     for row_idx, row in enumerate(policy):
         line = ''
         for col_idx, item in enumerate(row):
-            if [row_idx, col_idx] in mdp.terminals:
+            if mdp.terminal_mask[mdp.state_of(row_idx, col_idx)]:
                 line += 'T'
-            elif [row_idx, col_idx] in mdp.wall_locs:
+            elif mdp.wall_mask[mdp.state_of(row_idx, col_idx)]:
                 line += '-'
             else:
                 line += item
@@ -178,7 +766,28 @@ def display_policy(policy, mdp):
     print()
 
 def main():
-    with open("mdp_input.txt") as fp:
+    parser = argparse.ArgumentParser(description="Value and policy iteration on a gridworld MDP")
+    parser.add_argument('input', nargs='?', default="mdp_input.txt")
+    parser.add_argument('--backend', choices=['python', 'numpy'], default='python',
+                        help="numpy runs the solvers on the compiled ArrayModel")
+    parser.add_argument('--method', choices=sorted(VALUE_METHODS), default='jacobi',
+                        help="value iteration: synchronous sweeps, in-place sweeps or prioritized sweeping")
+    parser.add_argument('--evaluation', choices=EVALUATIONS, default='modified',
+                        help="policy evaluation: Bellman sweeps or an exact sparse solve (scipy)")
+    parser.add_argument('--sweeps', type=int, default=1, help="Bellman sweeps per policy evaluation")
+    parser.add_argument('--stats', action='store_true', help="print iteration counts and phase timings to stderr")
+    parser.add_argument('--quiet', action='store_true', help="print only the policies, not the value grids")
+    parser.add_argument('--snapshot-every', type=int, default=None, metavar='K',
+                        help="keep the values of every K-th iteration for --output")
+    parser.add_argument('--output', metavar='PREFIX',
+                        help="write values, residuals and snapshots to PREFIX{value,policy}-*.npy/.csv")
+    parser.add_argument('--format', choices=['npy', 'csv'], default='npy' if np is not None else 'csv')
+    args = parser.parse_args()
+    numpy_backend = args.backend == 'numpy'
+    if numpy_backend and args.method != 'jacobi':
+        parser.error("the numpy backend only runs jacobi value iteration")
+
+    with open(args.input) as fp:
         lines = fp.readlines()
         params = parse_input(lines)
 
@@ -190,13 +799,26 @@ def main():
         mdp.reward, " ".join(str(prob) for prob in mdp.transition_probs), mdp.discount, mdp.epsilon))
         
     print("################ VALUE ITERATION ###########################\n")
-    optimal_PI = value_iter(mdp)
+    value_stats = SolverStats('value iteration (%s)' % args.method)
+    value_history = History(mdp, not args.quiet, snapshot_every=args.snapshot_every)
+    optimal_PI = (value_iter_numpy if numpy_backend else VALUE_METHODS[args.method])(mdp, value_stats, value_history)
     print("Final Policy\n")
     display_policy(optimal_PI, mdp)
 
 
     print("################ POLICY ITERATION ###########################\n")
-    PI = policy_iter(mdp)
+    policy_stats = SolverStats('policy iteration (%s)' % args.evaluation)
+    policy_history = History(mdp, not args.quiet, snapshot_every=args.snapshot_every)
+    PI = (policy_iter_numpy if numpy_backend else policy_iter)(mdp, args.evaluation, args.sweeps, policy_stats,
+                                                               policy_history)
     display_policy(PI, mdp)
 
+    if args.output:
+        value_history.save(args.output + 'value-', args.format)
+        policy_history.save(args.output + 'policy-', args.format)
+
+    if args.stats:
+        print(value_stats, file=sys.stderr)
+        print(policy_stats, file=sys.stderr)
+
 if __name__=="__main__":main()
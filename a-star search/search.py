@@ -1,93 +1,122 @@
 import random
 import math
-import time
 import psutil
 import os
-from collections import deque
 import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from sliding_puzzle.astar import astar
+from sliding_puzzle.benchmark import random_walk
+from sliding_puzzle.bfs import breadth_first_search
+from sliding_puzzle.domain import get_puzzle
+from sliding_puzzle.heuristics import HEURISTICS, get_heuristic
+from sliding_puzzle.stats import SearchStats
+from sliding_puzzle.validate import is_solvable, read_board
 
-# This class defines the state of the problem in terms of board configuration
+
+# This class defines the state of the problem in terms of board configuration.
+# Tiles are kept packed into one integer with the bits per cell of the board size (see
+# sliding_puzzle.domain) and the empty tile position cached
 class Board:
+    __slots__ = ('size', 'packed', 'blank')
+
     def __init__(self, tiles):
         self.size = int(math.sqrt(len(tiles)))  # defining length/width of the board
-        self.tiles = tiles
-
-    # This function returns the resulting state from taking particular action from current state
+        puzzle = get_puzzle(self.size)
+        self.packed = puzzle.pack(tiles)
+        self.blank = puzzle.find_blank(self.packed)
+
+    @classmethod
+    def from_packed(cls, packed, blank, size):
+        board = cls.__new__(cls)
+        board.size = size
+        board.packed = packed
+        board.blank = blank
+        return board
+
+    @property
+    def tiles(self):
+        return get_puzzle(self.size).unpack(self.packed)
+
+    # This function returns the resulting state from taking particular action from current state,
+    # or None if the action would move the empty tile off the board
     def execute_action(self, action):
-        new_tiles = self.tiles[:]
-        empty_index = new_tiles.index('0')
-        if action == 'L':
-            if empty_index % self.size > 0:
-                new_tiles[empty_index - 1], new_tiles[empty_index] = new_tiles[empty_index], new_tiles[empty_index - 1]
-        if action == 'R':
-            if empty_index % self.size < (self.size - 1):
-                new_tiles[empty_index + 1], new_tiles[empty_index] = new_tiles[empty_index], new_tiles[empty_index + 1]
-        if action == 'U':
-            if empty_index - self.size >= 0:
-                new_tiles[empty_index - self.size], new_tiles[empty_index] = new_tiles[empty_index], new_tiles[
-                    empty_index - self.size]
-        if action == 'D':
-            if empty_index + self.size < self.size * self.size:
-                new_tiles[empty_index + self.size], new_tiles[empty_index] = new_tiles[empty_index], new_tiles[
-                    empty_index + self.size]
-        return Board(new_tiles)
+        puzzle = get_puzzle(self.size)
+        target = puzzle.move_target(self.blank, action)
+        if target is None:
+            return None
+        return Board.from_packed(puzzle.slide(self.packed, self.blank, target), target, self.size)
+
+    # (action, resulting board) for every legal action except the one undoing prev, read from the
+    # precomputed move table of the board size
+    def successors(self, prev=None):
+        puzzle = get_puzzle(self.size)
+        for target, action in puzzle.pruned_moves[self.blank][prev]:
+            yield action, Board.from_packed(puzzle.slide(self.packed, self.blank, target), target, self.size)
 
 
 # This class defines the node on the search tree, consisting of state, parent and previous action
 class Node:
+    __slots__ = ('state', 'parent', 'action', 'heuristic', 'g', 'h')
+
     def __init__(self, state, parent, action, heuristic=0):
         self.state = state
         self.parent = parent
         self.action = action
         self.heuristic = heuristic
-
-
-        if heuristic == "manhattan":
-            self.h = Search.manhattanDistance(self.state)
-        elif heuristic == "misplaced":
-            self.h = Search.misplacedTiles(self.state)
+        self.g = 0 if parent is None else parent.g + 1
+
+        if heuristic in HEURISTICS:
+            h = get_heuristic(heuristic, state.size)
+            if parent is not None and parent.heuristic == heuristic:
+                # only the tile that moved into the parent's empty cell changes the value
+                moved = get_puzzle(state.size).tile_at(state.packed, parent.state.blank)
+                self.h = h.update(parent.h, moved, state.blank, parent.state.blank, state.packed)
+            else:
+                self.h = h.evaluate(state.packed)
         else:
             self.h = 0
 
 
 
 class Search:
+
+    # goals: custom goal layout(s) instead of the default one, see sliding_puzzle.domain.goal_layouts
+    def __init__(self, goals=None):
+        self.goals = goals
+
+    def puzzle(self, size=4):
+        return get_puzzle(size, goals=self.goals)
     
     @staticmethod
     def manhattanDistance(tiles, size):
-        distance = 0
-        goal = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 0]
-        for i, tile in enumerate(tiles):
-            if tile != 0:
-                tile_row, tile_col = divmod(i, size)
-                goal_index = goal.index(tile)
-                goal_row, goal_col = divmod(goal_index, size)
-                distance += abs(tile_row - goal_row) + abs(tile_col - goal_col)
-        return distance
+        return get_heuristic("manhattan", size).evaluate(get_puzzle(size).pack(tiles))
 
 
     @staticmethod
     def misplacedTiles(tiles):
-        distance = 0
-        goal = ['1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '11', '12', '13', '14', '15', '0']
-        for i, tile in enumerate(tiles):
-            if tile != goal[i]:
-                distance += 1
-        return distance
-
-    # Utility function to randomly generate 15-puzzle
-    def generate_puzzle(self, size):
+        size = int(math.sqrt(len(tiles)))
+        return get_heuristic("misplaced", size).evaluate(get_puzzle(size).pack(tiles))
+
+    # Utility function to randomly generate 15-puzzle. With walk_length the board is a seeded random
+    # walk of that many moves back from the goal (see sliding_puzzle.benchmark), which controls difficulty
+    def generate_puzzle(self, size, walk_length=None, seed=None):
+        if walk_length is not None:
+            numbers = self.puzzle(size).unpack(random_walk(walk_length, self.puzzle(size), seed))
+            return Node(Board(numbers), None, None, None)
         numbers = list(range(size * size))
         random.shuffle(numbers)
+        if not is_solvable(numbers, goals=self.goals):
+            # swapping two tiles (not the empty one) moves the board to the other parity class
+            i, j = [k for k, tile in enumerate(numbers) if tile][:2]
+            numbers[i], numbers[j] = numbers[j], numbers[i]
         return Node(Board(numbers), None, None, None)
 
     # This function returns the list of children obtained after simulating the actions on current node
     def get_children(self, parent_node, heuristic):
         children = []
-        actions = ['L', 'R', 'U', 'D']  # left,right, up , down ; actions define direction of movement of empty tile
-        for action in actions:
-            child_state = parent_node.state.execute_action(action)
+        # only legal actions are generated; undoing the action that led to the parent is skipped
+        for action, child_state in parent_node.state.successors(parent_node.action):
             child_node = Node(child_state, parent_node, action, heuristic)
             children.append(child_node)
         return children
@@ -101,83 +130,51 @@ class Search:
         path.reverse()
         return path
 
-    # This function runs breadth first search from the given root node and returns path, number of nodes expanded and total time taken
+    # This function runs breadth first search from the given root node and returns path, number of nodes expanded and total time taken.
+    # The search runs on the arena node store in sliding_puzzle.bfs instead of Node objects
     def run_bfs(self, root_node):
-        start_time = time.time()
-        frontier = deque([root_node])
-        explored = set()
-        max_memory = 0
-        while (len(frontier) > 0):
-            max_memory = max(max_memory, sys.getsizeof(frontier) + sys.getsizeof(explored))
-            cur_time = time.time()
-            cur_node = frontier.popleft()
-            explored.add(cur_node)
-            if (self.goal_test(cur_node.state.tiles)):
-                path = self.find_path(cur_node)
-                end_time = time.time()
-
-                return path, len(explored), (end_time - start_time), max_memory
-            for child in self.get_children(cur_node, self.heuristic):
-                if child in explored:
-                    continue
-                else:
-                    frontier.append(child)
-        print("frontier empty")
-        return False
+        result = breadth_first_search(root_node.state.packed, self.puzzle(root_node.state.size))
+        if result is None:
+            print("frontier empty")
+            return False
+        return result
     
-    def run_astarSearch(self, root_node, heuristic):
-        start_time = time.time()
-        expanded_node = 0
-        end_time = time.time()
-        frontier = [root_node]
-        memory_consumed_each_depth = []
-        memory_consumed = 0
-        explored = []
-
-        while frontier:
-            memory_consumed = max(memory_consumed, str(sys.getsizeof(frontier)) + str(sys.getsizeof(explored))) #Calculate memory
-            cur_time = time.time()
-            if cur_time - start_time > 30:
-                return "solution not found"
-            cur_node = frontier.pop(0)
-            expanded_node += 1
-            explored.append(cur_node)
-
-            if self.goal_test(cur_node.state.tiles):
-                path = self.find_path(cur_node)
-                end_time = time.time()
-                return (path, expanded_node, end_time - start_time, memory_consumed)
-            
-            for child in self.get_children(cur_node, heuristic):
-                if child not in explored:
-                    frontier.append(child)
-                    frontier.sort(key=lambda node: node.g + node.h)
-        return False
+    # A* search from the given root node, see sliding_puzzle.astar for the heap based engine.
+    # Returns path, number of nodes expanded, total time taken and memory. time_limit and node_limit
+    # are the budget of this call; with a checkpoint path an unfinished search is saved there and the
+    # next call with the same path resumes it (see sliding_puzzle.checkpoint)
+    def run_astarSearch(self, root_node, heuristic, time_limit=30, stats=None, node_limit=None, checkpoint=None):
+        board = root_node.state
+        result = astar(board.packed, heuristic, self.puzzle(board.size), time_limit, node_limit, stats, checkpoint)
+        if result is None:
+            return "solution not found"
+        return result
 
     def goal_test(self, cur_tiles):
-        return cur_tiles == ['1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '11', '12', '13', '14', '15', '0']
+        puzzle = self.puzzle(int(math.sqrt(len(cur_tiles))))
+        return puzzle.pack(cur_tiles) in puzzle.goals
 
-    def solve(self, initial_state, heuristic = "manhattan"): # Format : "1 0 2 4 5 7 3 8 9 6 11 12 13 10 14 15"
-        initial_list = initial_state.split(" ")
-        goal_list = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 0]
-        # Convert the strings to integers
-        initial_list = list(map(int, initial_list))
-        goal_list = list(map(int, goal_list))
-
-        # Create the initial and goal nodes
+    # Raises InvalidBoardError / UnsolvableBoardError before searching, see sliding_puzzle.validate.
+    # Time and peak memory come from a sliding_puzzle.stats.SearchStats kept in self.stats
+    def solve(self, initial_state, heuristic = "manhattan", time_limit=30, node_limit=None, checkpoint=None): # Format : "1 0 2 4 5 7 3 8 9 6 11 12 13 10 14 15"
+        initial_list = read_board(initial_state, goals=self.goals)
         initial_node = Node(Board(initial_list), None, None)
-        goal_node = Node(Board(goal_list), None, None)
-        
+
         #Please use this as a reference to run with gradescope autograder.
-        if heuristic == "manhattan":
-            solution_moves = self.manhattanDistance(initial_list, len(initial_list))
-        elif heuristic == "misplaced tiles":
-            solution_moves = self.misplacedTiles(initial_list)
+        self.stats = SearchStats().start()
+        result = self.run_astarSearch(initial_node, heuristic, time_limit, self.stats, node_limit, checkpoint)
+        if result == "solution not found":
+            print(result)
+            return None
+        path, expanded_nodes, _, _ = result
+        time_taken = self.stats.elapsed
+        memory_consumed = self.stats.peak_memory
+        solution_moves = "".join(path)
         
         print("Moves: " + solution_moves)
-        print("Number of expanded Nodes: " + str(""))
-        print("Time Taken: " + str(""))
-        print("Max Memory (Bytes): " + str(""))
+        print("Number of expanded Nodes: " + str(expanded_nodes))
+        print("Time Taken: " + str(time_taken))
+        print("Max Memory (Bytes): " + str(memory_consumed))
         return solution_moves # Get the list of moves to solve the puzzle. Format is "RDLDDRR"
 
 if __name__ == '__main__':
@@ -1,106 +1,84 @@
 import random
 import math
-import time
 import psutil
 import os
-from collections import deque
 import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from sliding_puzzle.domain import get_puzzle
+from sliding_puzzle.heuristics import get_heuristic
+from sliding_puzzle.idastar import idastar, parallel_idastar
+from sliding_puzzle.stats import SearchStats
+from sliding_puzzle.validate import read_board
+
 class Search:
+
+    # goals: custom goal layout(s) instead of the default one, see sliding_puzzle.domain.goal_layouts
+    def __init__(self, goals=None):
+        self.goals = goals
+
+    def puzzle(self, size=4):
+        return get_puzzle(size, goals=self.goals)
  
-    def misplacedTiles(goal_state, node):
-        n = node.state.tiles
-        number_of_misplaced_tiles = sum([n[i] != goal_state[i] for i in range(len(goal_state))])
-        return number_of_misplaced_tiles
+    def misplacedTiles(self, node):
+        puzzle = self.puzzle(node.state.size)
+        return get_heuristic("misplaced", puzzle).evaluate(puzzle.pack(node.state.tiles))
     
-    def manhattanDistance(child_state, self):
-        goal_state = self.get_goal()
-        size_of_child_state = child_state.state.size
-        child_state_tiles = child_state.state.tiles
-        goal_state_tiles = goal_state
-        child_state_array = [child_state_tiles[i:i+size_of_child_state] for i in range(0, len(child_state_tiles), size_of_child_state)]
-        goal_state_array = [goal_state_tiles[i:i+size_of_child_state] for i in range(0, len(goal_state_tiles), size_of_child_state)]
-        manhattan_distance = 0
-        for i in range(size_of_child_state):
-            for j in range(size_of_child_state):
-                if child_state_array[i][j] != 0:
-                    row_goal, col_goal = divmod(goal_state.index(child_state_array[i][j]), size_of_child_state)
-                    manhattan_distance += abs(i - row_goal) + abs(j - col_goal)
-        return manhattan_distance
+    # Goal cells come from the precomputed goal position table, see sliding_puzzle.heuristics
+    def manhattanDistance(self, node):
+        puzzle = self.puzzle(node.state.size)
+        return get_heuristic("manhattan", puzzle).evaluate(puzzle.pack(node.state.tiles))
 
     
-    def run_idastar(root_node, heuristic, self):
-        start_time = time.time()
-        bound = root_node.cost
-        path = deque([root_node])
-        explored = set()
-        iteration = 0
-        while True:
-            explored.clear()
-            found, final_path, no_of_nodes, cost = self.run_dls(path, 0, bound, explored, heuristic)
-            if found == 'FOUND':
-                end_time = time.time()
-                return final_path, no_of_nodes, (end_time - start_time), sys.getsizeof(explored)
-            if cost == float('inf'):
-                return None
-            bound = cost
-            iteration += 1
-
-    def run_dls(path, cost, limit, explored, heuristic, self):
-        current_node = path[-1]
-        f_score = cost + current_node.cost
-
-        if f_score > limit:
-            return 'NOT FOUND', None, None, f_score
-
-        if self.goal_test(current_node):
-            final_path = self.find_path(current_node)
-            return 'FOUND', final_path, len(explored), None
-
-        lowest_cost = float('inf')
-
-        for child_node in self.get_children(current_node, heuristic):
-            if child_node not in path:
-                path.append(child_node)
-                explored.add(child_node)
-                found, final_path, no_of_nodes, cost = self.run_dls(path, cost + 1, limit, explored, heuristic)
-                if found == 'FOUND':
-                    return 'FOUND', final_path, len(explored), None
-                if cost < lowest_cost:
-                    lowest_cost = cost
-                path.pop()
-
-        if lowest_cost == float('inf'):
-            return 'NOT FOUND', None, None, lowest_cost
-        else:
-            return 'NOT FOUND', None, None, lowest_cost + current_node.cost
+    # IDA* from the given tiles, see sliding_puzzle.idastar for the engine. With workers > 1
+    # the search tree is split between that many processes, otherwise an optional
+    # sliding_puzzle.transposition.TranspositionTable can be passed as table.
+    # Returns path, number of nodes expanded, total time taken, memory and the
+    # (threshold, nodes expanded) pair of every iteration. stats is an optional
+    # sliding_puzzle.stats.SearchStats. With a checkpoint path a serial search that runs out of budget
+    # is saved there and the next call with the same path resumes it (see sliding_puzzle.checkpoint)
+    def run_idastar(self, root_tiles, heuristic, node_limit=None, time_limit=None, workers=None, table=None, stats=None,
+                    checkpoint=None):
+        puzzle = self.puzzle(int(math.sqrt(len(root_tiles))))
+        start = puzzle.pack(root_tiles)
+        if workers is not None and workers > 1:
+            return parallel_idastar(start, heuristic, puzzle, workers, None, node_limit, time_limit, stats)
+        return idastar(start, heuristic, puzzle, node_limit, time_limit, table, stats, checkpoint)
 
 
     def goal_test(self, cur_tiles):
-        return cur_tiles == ['1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '11', '12', '13', '14', '15', '0']
+        puzzle = self.puzzle(int(math.sqrt(len(cur_tiles))))
+        return puzzle.pack(cur_tiles) in puzzle.goals
 
-    def get_goal():
-        return ['1','2','3','4','5','6','7','8','9','10','11','12','13','14','15','0']
+    def get_goal(self):
+        return [str(tile) for tile in self.puzzle().goal_tiles]
     
     
-    def solve(self, initial_state, heuristic = "manhattan"): # Format : "1 0 2 4 5 7 3 8 9 6 11 12 13 10 14 15"
-        initial_list = initial_state.split(" ")
+    # Raises InvalidBoardError / UnsolvableBoardError before searching, see sliding_puzzle.validate.
+    # Time and peak memory come from a sliding_puzzle.stats.SearchStats kept in self.stats
+    def solve(self, initial_state, heuristic = "manhattan", time_limit=None, node_limit=None, checkpoint=None): # Format : "1 0 2 4 5 7 3 8 9 6 11 12 13 10 14 15"
+        initial_list = read_board(initial_state, goals=self.goals)
         """ 
         Please use this as a reference to run with gradescope autograder.
+        Heuristics: "manhattan", "misplaced tiles", "linear conflict" (manhattan plus linear conflicts)
         """
-        if heuristic == "manhattan":
-            solution_moves = self.manhattanDistance(initial_list)
-        if heuristic == "misplaced tiles":
-            solution_moves = self.misplacedTiles(initial_list)
+        self.stats = SearchStats().start()
+        result = self.run_idastar(initial_list, heuristic, node_limit, time_limit, stats=self.stats, checkpoint=checkpoint)
+        if result is None:
+            print("solution not found")
+            return None
+        self.path, expanded_nodes, _, _, iterations = result
+        time_taken = self.stats.elapsed
+        memory_consumed = self.stats.peak_memory
         
         print("Moves: " + " ".join(self.path))
-        print("Number of expanded Nodes: " + str(""))
-        print("Time Taken: " + str(""))
-        print("Max Memory (Bytes): " + str(""))
+        print("Number of expanded Nodes: " + str(expanded_nodes))
+        print("Time Taken: " + str(time_taken))
+        print("Max Memory (Bytes): " + str(memory_consumed))
         return "".join(self.path) # Get the list of moves to solve the puzzle. Format is "RDLDDRR"
 
 
 
 
 if __name__ == '__main__':
-    agent = Search()
\ No newline at end of file
+    agent = Search()
\ No newline at end of file
@@ -0,0 +1,3 @@
+# Shared building blocks for the sliding puzzle solvers in this repository
+from .state import PackedBoard, pack, unpack
+from .astar import astar
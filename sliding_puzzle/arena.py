@@ -0,0 +1,78 @@
+import sys
+from array import array
+
+from .domain import get_puzzle
+
+# Arena node store for the searches that keep every generated node (BFS, A*).
+# A node is a row of parallel typed arrays addressed by its index: the packed state, the
+# cost g, the index of its parent (ROOT for the start), the code of the move that reached
+# it and the position of the empty tile. That is 8 + 2 + 4 + 1 + 1 + 1 = 17 bytes per node
+# (plus the search's state -> index map) instead of a Node, a Board and their __dict__s.
+# Paths are rebuilt by following parent indices back to the root.
+#
+# Boards that do not fit in 64 bits (more than 16 cells) keep their states in a list.
+
+MOVE_CODES = 'UDLR'
+MOVE_INDEX = {direction: code for code, direction in enumerate(MOVE_CODES)}
+NO_MOVE = 255
+ROOT = -1
+
+
+class NodeStore:
+    def __init__(self, size=4):
+        puzzle = get_puzzle(size)
+        self.states = array('Q') if puzzle.cells * puzzle.bits <= 64 else []
+        self.g = array('H')
+        self.parents = array('i')
+        self.moves = array('B')
+        self.blanks = array('B')
+        self.closed = bytearray() # set by searches that close expanded nodes (A*)
+
+    # Appends a node and returns its index
+    def add(self, state, g, parent=ROOT, move=None, blank=0):
+        index = len(self.g)
+        self.states.append(state)
+        self.g.append(g)
+        self.parents.append(parent)
+        self.moves.append(NO_MOVE if move is None else MOVE_INDEX[move])
+        self.blanks.append(blank)
+        self.closed.append(0)
+        return index
+
+    # Records a cheaper way to reach an existing node
+    def relink(self, index, g, parent, move):
+        self.g[index] = g
+        self.parents[index] = parent
+        self.moves[index] = MOVE_INDEX[move]
+
+    # Moves from the root to the node at index
+    def path(self, index):
+        path = []
+        while self.parents[index] != ROOT:
+            path.append(MOVE_CODES[self.moves[index]])
+            index = self.parents[index]
+        path.reverse()
+        return path
+
+    # The columns as a dict, e.g. for a checkpoint (see sliding_puzzle.checkpoint)
+    def columns(self):
+        return {'states': self.states, 'g': self.g, 'parents': self.parents, 'moves': self.moves,
+                'blanks': self.blanks, 'closed': self.closed}
+
+    def restore(self, columns):
+        self.states = columns['states']
+        self.g = columns['g']
+        self.parents = columns['parents']
+        self.moves = columns['moves']
+        self.blanks = columns['blanks']
+        self.closed = columns['closed']
+
+    def nbytes(self):
+        total = sum(sys.getsizeof(column) for column in (self.states, self.g, self.parents, self.moves,
+                                                          self.blanks, self.closed))
+        if isinstance(self.states, list) and self.states:
+            total += len(self.states) * sys.getsizeof(self.states[0])
+        return total
+
+    def __len__(self):
+        return len(self.g)
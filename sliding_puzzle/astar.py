@@ -0,0 +1,142 @@
+import heapq
+import sys
+import time
+from array import array
+
+from .arena import NodeStore
+from .checkpoint import heuristic_key, open_checkpoint
+from .domain import get_puzzle
+from .heuristics import get_heuristic
+
+
+# A* over packed states.
+# Every generated state is a node in an arena NodeStore (see sliding_puzzle.arena) holding
+# its g, parent index, move and empty tile; index_of maps a packed state to its node. The
+# frontier is a binary heap of (f, h, g, node index) entries, so among equal f the node
+# closest to the goal is expanded first. Instead of searching the heap for a node to
+# decrease its key, a better path relinks the node and pushes a new entry; outdated entries
+# are skipped when they are popped (lazy deletion). Memory is sampled every 1024
+# expansions and at the goal; the store and index_of only grow.
+#
+# heuristic is a name from sliding_puzzle.heuristics or a heuristic instance; children are
+# scored incrementally from their parent's h since only one tile moves. stats is an
+# optional sliding_puzzle.stats.SearchStats, sampled with the heap size.
+#
+# With a checkpoint path (see sliding_puzzle.checkpoint) the arena and the live frontier
+# are saved every checkpoint_every seconds and when a budget runs out, and a later call
+# with the same start, size, heuristic and path resumes from them. time_limit and
+# node_limit apply to each call; the reported time and node count cover all of them.
+#
+# Returns (path, number of expanded nodes, time taken, memory) like Search.run_astarSearch,
+# or None if the time or node limit runs out or the frontier empties.
+def astar(start, heuristic='manhattan', size=4, time_limit=None, node_limit=None, stats=None,
+          checkpoint=None, checkpoint_every=60.0):
+    if stats is not None:
+        stats.phase('setup')
+    saver = open_checkpoint(checkpoint, 'astar', (start, get_puzzle(size).key, heuristic_key(heuristic)),
+                            checkpoint_every)
+    if isinstance(heuristic, str):
+        heuristic = get_heuristic(heuristic, size)
+    start_time = time.time()
+    puzzle = get_puzzle(size)
+    goals = puzzle.goals
+    moves = puzzle.moves
+    bits = puzzle.bits
+    mask = puzzle.mask
+
+    store = NodeStore(puzzle)
+    expanded_node = 0
+    generated = 0
+    resumed = saver.load() if saver is not None else None
+    if resumed is None:
+        store.add(start, 0, blank=puzzle.find_blank(start))
+        h = heuristic.evaluate(start)
+        frontier = [(h, h, 0, 0)]
+    else:
+        store.restore(resumed['store'])
+        entries = resumed['frontier']
+        frontier = [tuple(entries[k:k + 4]) for k in range(0, len(entries), 4)]
+        heapq.heapify(frontier)
+        expanded_node = resumed['expanded']
+        generated = resumed['generated']
+        start_time -= resumed['elapsed']
+    run_start = time.time()
+    run_expanded = expanded_node
+    states = store.states
+    costs = store.g
+    blanks = store.blanks
+    closed = store.closed
+    add = store.add
+    update = heuristic.update
+    push = heapq.heappush
+    index_of = {state: i for i, state in enumerate(states)}
+    memory_consumed = 0
+    if stats is not None:
+        stats.phase('search')
+
+    # live heap entries (plus the popped, not yet expanded one) and the arena, enough to
+    # carry on exactly where the search stopped
+    def save(current):
+        entries = array('q', current)
+        for entry in frontier:
+            if not closed[entry[3]] and entry[2] == costs[entry[3]]:
+                entries.extend(entry)
+        saver.save({'store': store.columns(), 'frontier': entries, 'expanded': expanded_node,
+                    'generated': generated, 'elapsed': time.time() - start_time})
+
+    try:
+        while frontier:
+            f, h, g, i = heapq.heappop(frontier)
+            if closed[i] or g > costs[i]:
+                continue # stale entry, the node was reached more cheaply later
+
+            state = states[i]
+            if state in goals:
+                memory_consumed = max(memory_consumed, sys.getsizeof(frontier) + sys.getsizeof(index_of) + store.nbytes())
+                if stats is not None:
+                    stats.phase('path')
+                if saver is not None:
+                    saver.remove()
+                return store.path(i), expanded_node, time.time() - start_time, memory_consumed
+
+            if ((time_limit is not None and time.time() - run_start > time_limit)
+                    or (node_limit is not None and expanded_node - run_expanded >= node_limit)):
+                if saver is not None:
+                    save((f, h, g, i))
+                return None
+            if saver is not None and not expanded_node & 0x3FF and saver.due():
+                save((f, h, g, i))
+
+            closed[i] = 1
+            expanded_node += 1
+            if not expanded_node & 0x3FF:
+                memory_consumed = max(memory_consumed, sys.getsizeof(frontier) + sys.getsizeof(index_of) + store.nbytes())
+                if stats is not None:
+                    stats.expanded = expanded_node
+                    stats.generated = generated
+                    stats.sample(len(frontier))
+
+            blank = blanks[i]
+            child_g = g + 1
+            generated += len(moves[blank])
+            for target, direction in moves[blank]:
+                tile = (state >> (bits * target)) & mask
+                child = state - (tile << (bits * target)) + (tile << (bits * blank))
+                j = index_of.get(child)
+                if j is None:
+                    j = index_of[child] = add(child, child_g, i, direction, target)
+                elif closed[j] or child_g >= costs[j]:
+                    continue
+                else:
+                    store.relink(j, child_g, i, direction)
+                child_h = update(h, tile, target, blank, child)
+                push(frontier, (child_g + child_h, child_h, child_g, j))
+
+        if saver is not None:
+            saver.remove()
+        return None
+    finally:
+        if stats is not None:
+            stats.expanded = expanded_node
+            stats.generated = generated
+            stats.stop()
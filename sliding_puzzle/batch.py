@@ -0,0 +1,162 @@
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import math
+import os
+import sys
+
+from .astar import astar
+from .bfs import breadth_first_search
+from .domain import get_puzzle, goal_layouts
+from .heuristics import HEURISTICS
+from .idastar import idastar
+from .iddfs import iddfs
+from .stats import SearchStats
+from .validate import InvalidBoardError, UnsolvableBoardError, read_board
+
+# Batch solving: boards are fanned out over a process pool and the results come back as
+# plain dictionaries (one JSON line each from the command line) in order of completion.
+#
+#   python -m sliding_puzzle.batch boards.txt --workers 8 --algorithm idastar --time-limit 30
+#
+# Every engine runs under its own node / time budget, so a slow instance ends with status
+# "budget exceeded" instead of stalling the batch; with --checkpoint-dir its progress is
+# kept and the next run over the same boards carries on from it. Every searched board's record carries
+# the engine's sliding_puzzle.stats.SearchStats under 'stats'.
+#
+# --goal (repeatable) solves to custom goal layouts instead of the default one. Puzzles and
+# heuristic tables are cached per goal in every worker (see sliding_puzzle.domain), so all
+# boards of a batch share them.
+
+
+def run_astar(start, heuristic, size, node_limit, time_limit, stats=None, checkpoint=None):
+    return astar(start, heuristic, size, time_limit, node_limit, stats, checkpoint)
+
+
+def run_idastar(start, heuristic, size, node_limit, time_limit, stats=None, checkpoint=None):
+    result = idastar(start, heuristic, size, node_limit, time_limit, stats=stats, checkpoint=checkpoint)
+    return None if result is None else result[:4]
+
+
+# the uninformed searches ignore the heuristic, breadth first search is not checkpointed
+def run_bfs(start, heuristic, size, node_limit, time_limit, stats=None, checkpoint=None):
+    return breadth_first_search(start, size, node_limit, time_limit, stats)
+
+
+def run_iddfs(start, heuristic, size, node_limit, time_limit, stats=None, checkpoint=None):
+    result = iddfs(start, size, node_limit=node_limit, time_limit=time_limit, stats=stats, checkpoint=checkpoint)
+    return None if result is None else result[:4]
+
+
+ALGORITHMS = {
+    'astar': run_astar,
+    'bfs': run_bfs,
+    'idastar': run_idastar,
+    'iddfs': run_iddfs,
+}
+
+
+# Checkpoint file of one board's search in checkpoint_dir (see sliding_puzzle.checkpoint)
+def checkpoint_path(checkpoint_dir, tiles, algorithm, heuristic, goals=None):
+    text = ' '.join(map(str, tiles))
+    if goals is not None:
+        text += ' -> ' + repr(goal_layouts(goals, len(tiles)))
+    digest = hashlib.sha1(text.encode()).hexdigest()[:16]
+    return os.path.join(checkpoint_dir, '%s-%s-%s.ckpt' % (algorithm, heuristic.replace(' ', '_'), digest))
+
+
+# Solves one board and returns its result record, never raises: bad input ends with status
+# 'invalid' or 'unsolvable' and an engine error (e.g. a pattern database that is not built)
+# with status 'error', so one board cannot take down a batch. With a checkpoint_dir a
+# search that runs out of budget is saved there and resumed by the next run over the same
+# board. goals are custom goal layouts (see sliding_puzzle.domain.goal_layouts).
+def solve_one(board, algorithm='idastar', heuristic='manhattan', node_limit=None, time_limit=None, index=None,
+              checkpoint_dir=None, goals=None):
+    record = {'index': index, 'board': board if isinstance(board, str) else ' '.join(map(str, board))}
+    try:
+        tiles = read_board(board, goals=goals)
+    except UnsolvableBoardError as e:
+        record.update(status='unsolvable', error=str(e))
+        return record
+    except (InvalidBoardError, ValueError) as e:
+        record.update(status='invalid', error=str(e))
+        return record
+
+    puzzle = get_puzzle(math.isqrt(len(tiles)), goals=goals)
+    stats = SearchStats().start()
+    checkpoint = (None if checkpoint_dir is None
+                  else checkpoint_path(checkpoint_dir, tiles, algorithm, heuristic, goals))
+    try:
+        result = ALGORITHMS[algorithm](puzzle.pack(tiles), heuristic, puzzle, node_limit, time_limit, stats,
+                                       checkpoint)
+    except Exception as e:
+        record.update(status='error', error='%s: %s' % (type(e).__name__, e), stats=stats.as_dict())
+        return record
+    if result is None:
+        record.update(status='budget exceeded', stats=stats.as_dict())
+        return record
+    path, expanded_nodes, time_taken, memory_consumed = result
+    record.update(status='solved', moves=''.join(path), length=len(path), expanded=expanded_nodes,
+                  time=time_taken, memory=memory_consumed, stats=stats.as_dict())
+    return record
+
+
+# Solves every board of an iterable in a process pool and yields the result records as
+# they finish. At most workers * 2 boards are queued at once, so arbitrarily long
+# iterators (e.g. a file read line by line) are consumed lazily.
+def solve_batch(boards, workers=None, algorithm='idastar', heuristic='manhattan', node_limit=None, time_limit=None,
+                checkpoint_dir=None, goals=None):
+    if algorithm not in ALGORITHMS:
+        raise ValueError("unknown algorithm %r, expected one of %s" % (algorithm, ', '.join(sorted(ALGORITHMS))))
+    if heuristic not in HEURISTICS:
+        raise ValueError("unknown heuristic %r, expected one of %s" % (heuristic, ', '.join(sorted(HEURISTICS))))
+    workers = workers or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        window = workers * 2
+        pending = set()
+        for index, board in enumerate(boards):
+            pending.add(pool.submit(solve_one, board, algorithm, heuristic, node_limit, time_limit, index,
+                                    checkpoint_dir, goals))
+            if len(pending) >= window:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in concurrent.futures.as_completed(pending):
+            yield future.result()
+
+
+# Boards from a text file, one per line; blank lines and lines starting with # are skipped
+def read_boards(lines):
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve sliding puzzles in parallel and print JSON lines")
+    parser.add_argument('boards', help="file with one board per line, - for stdin")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--algorithm', default='idastar', choices=sorted(ALGORITHMS))
+    parser.add_argument('--heuristic', default='manhattan')
+    parser.add_argument('--node-limit', type=int, default=None, help="node budget per board")
+    parser.add_argument('--time-limit', type=float, default=None, help="seconds per board")
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help="save searches that run out of budget here and resume them on the next run")
+    parser.add_argument('--goal', action='append', default=None,
+                        help="goal layout, e.g. '0 1 2 3 4 5 6 7 8'; repeat for several goals")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.boards == '-' else open(args.boards)
+    try:
+        for record in solve_batch(read_boards(source), args.workers, args.algorithm, args.heuristic,
+                                  args.node_limit, args.time_limit, args.checkpoint_dir, args.goal):
+            print(json.dumps(record), flush=True)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+
+if __name__ == '__main__':
+    main()
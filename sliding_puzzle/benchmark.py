@@ -0,0 +1,418 @@
+import argparse
+import json
+import random
+import sys
+
+from .batch import ALGORITHMS, read_boards, solve_one
+from .domain import get_puzzle
+
+# Reproducible solver benchmark.
+#
+#   python -m sliding_puzzle.benchmark --tiers easy medium --count 10 --seed 1
+#   python -m sliding_puzzle.benchmark --korf-count 10 --write-baseline base.json
+#   python -m sliding_puzzle.benchmark --baseline base.json      (exits 1 on a regression)
+#
+# Instances are seeded random walks back from the goal, so they are always solvable and
+# their difficulty is set by the walk length (see TIERS), plus any instance file and, on
+# request (--korf-count), the Korf 100 15-puzzle set (KORF100), which is checked against
+# its published optimal lengths. The walk and file instances run on every --engines
+# engine / heuristic pair, the Korf instances on --korf-engines (KORF_ENGINES), all under
+# the same node and time budget and sequentially so timings do not compete for the CPU.
+#
+# Results can be saved as a JSON baseline. Node counts and solution lengths are
+# deterministic, so a later run is compared against the baseline exactly for lengths and
+# solved status and within a tolerance for expanded nodes (and, optionally, time); any
+# difference is reported as a regression. Runs that were not solved carry no signal, so an
+# engine that solves none of a tier's instances is reported, and a baseline without any
+# solved run is refused.
+
+# tier -> random walk length
+TIERS = {
+    'easy': 10,
+    'medium': 25,
+    'hard': 40,
+    'expert': 60,
+}
+
+# engine:heuristic pairs run by default; bfs and iddfs take no heuristic
+DEFAULT_ENGINES = (
+    'bfs',
+    'iddfs',
+    'astar:manhattan',
+    'astar:linear conflict',
+    'idastar:manhattan',
+    'idastar:linear conflict',
+)
+
+
+# Engines run on the Korf 100 instances by default. It needs the 15-puzzle pattern
+# database tables (python -m sliding_puzzle.build --size 4) and solves about half of the
+# set within the default budget, the default engines none of it.
+KORF_ENGINES = (
+    'idastar:pdb',
+)
+
+# Korf's 100 random 15-puzzle instances (Korf 1985, "Depth-first iterative-deepening")
+# in his goal convention, with their published optimal solution lengths. Instance n is
+# KORF100[n - 1].
+KORF100 = (
+    ('14 13 15 7 11 12 9 5 6 0 2 1 4 8 10 3', 57),
+    ('13 5 4 10 9 12 8 14 2 3 7 1 0 15 11 6', 55),
+    ('14 7 8 2 13 11 10 4 9 12 5 0 3 6 1 15', 59),
+    ('5 12 10 7 15 11 14 0 8 2 1 13 3 4 9 6', 56),
+    ('4 7 14 13 10 3 9 12 11 5 6 15 1 2 8 0', 56),
+    ('14 7 1 9 12 3 6 15 8 11 2 5 10 0 4 13', 52),
+    ('2 11 15 5 13 4 6 7 12 8 10 1 9 3 14 0', 52),
+    ('12 11 15 3 8 0 4 2 6 13 9 5 14 1 10 7', 50),
+    ('3 14 9 11 5 4 8 2 13 12 6 7 10 1 15 0', 46),
+    ('13 11 8 9 0 15 7 10 4 3 6 14 5 12 2 1', 59),
+    ('5 9 13 14 6 3 7 12 10 8 4 0 15 2 11 1', 57),
+    ('14 1 9 6 4 8 12 5 7 2 3 0 10 11 13 15', 45),
+    ('3 6 5 2 10 0 15 14 1 4 13 12 9 8 11 7', 46),
+    ('7 6 8 1 11 5 14 10 3 4 9 13 15 2 0 12', 59),
+    ('13 11 4 12 1 8 9 15 6 5 14 2 7 3 10 0', 62),
+    ('1 3 2 5 10 9 15 6 8 14 13 11 12 4 7 0', 42),
+    ('15 14 0 4 11 1 6 13 7 5 8 9 3 2 10 12', 66),
+    ('6 0 14 12 1 15 9 10 11 4 7 2 8 3 5 13', 55),
+    ('7 11 8 3 14 0 6 15 1 4 13 9 5 12 2 10', 46),
+    ('6 12 11 3 13 7 9 15 2 14 8 10 4 1 5 0', 52),
+    ('12 8 14 6 11 4 7 0 5 1 10 15 3 13 9 2', 54),
+    ('14 3 9 1 15 8 4 5 11 7 10 13 0 2 12 6', 59),
+    ('10 9 3 11 0 13 2 14 5 6 4 7 8 15 1 12', 49),
+    ('7 3 14 13 4 1 10 8 5 12 9 11 2 15 6 0', 54),
+    ('11 4 2 7 1 0 10 15 6 9 14 8 3 13 5 12', 52),
+    ('5 7 3 12 15 13 14 8 0 10 9 6 1 4 2 11', 58),
+    ('14 1 8 15 2 6 0 3 9 12 10 13 4 7 5 11', 53),
+    ('13 14 6 12 4 5 1 0 9 3 10 2 15 11 8 7', 52),
+    ('9 8 0 2 15 1 4 14 3 10 7 5 11 13 6 12', 54),
+    ('12 15 2 6 1 14 4 8 5 3 7 0 10 13 9 11', 47),
+    ('12 8 15 13 1 0 5 4 6 3 2 11 9 7 14 10', 50),
+    ('14 10 9 4 13 6 5 8 2 12 7 0 1 3 11 15', 59),
+    ('14 3 5 15 11 6 13 9 0 10 2 12 4 1 7 8', 60),
+    ('6 11 7 8 13 2 5 4 1 10 3 9 14 0 12 15', 52),
+    ('1 6 12 14 3 2 15 8 4 5 13 9 0 7 11 10', 55),
+    ('12 6 0 4 7 3 15 1 13 9 8 11 2 14 5 10', 52),
+    ('8 1 7 12 11 0 10 5 9 15 6 13 14 2 3 4', 58),
+    ('7 15 8 2 13 6 3 12 11 0 4 10 9 5 1 14', 53),
+    ('9 0 4 10 1 14 15 3 12 6 5 7 11 13 8 2', 49),
+    ('11 5 1 14 4 12 10 0 2 7 13 3 9 15 6 8', 54),
+    ('8 13 10 9 11 3 15 6 0 1 2 14 12 5 4 7', 54),
+    ('4 5 7 2 9 14 12 13 0 3 6 11 8 1 15 10', 42),
+    ('11 15 14 13 1 9 10 4 3 6 2 12 7 5 8 0', 64),
+    ('12 9 0 6 8 3 5 14 2 4 11 7 10 1 15 13', 50),
+    ('3 14 9 7 12 15 0 4 1 8 5 6 11 10 2 13', 51),
+    ('8 4 6 1 14 12 2 15 13 10 9 5 3 7 0 11', 49),
+    ('6 10 1 14 15 8 3 5 13 0 2 7 4 9 11 12', 47),
+    ('8 11 4 6 7 3 10 9 2 12 15 13 0 1 5 14', 49),
+    ('10 0 2 4 5 1 6 12 11 13 9 7 15 3 14 8', 59),
+    ('12 5 13 11 2 10 0 9 7 8 4 3 14 6 15 1', 53),
+    ('10 2 8 4 15 0 1 14 11 13 3 6 9 7 5 12', 56),
+    ('10 8 0 12 3 7 6 2 1 14 4 11 15 13 9 5', 56),
+    ('14 9 12 13 15 4 8 10 0 2 1 7 3 11 5 6', 64),
+    ('12 11 0 8 10 2 13 15 5 4 7 3 6 9 14 1', 56),
+    ('13 8 14 3 9 1 0 7 15 5 4 10 12 2 6 11', 41),
+    ('3 15 2 5 11 6 4 7 12 9 1 0 13 14 10 8', 55),
+    ('5 11 6 9 4 13 12 0 8 2 15 10 1 7 3 14', 50),
+    ('5 0 15 8 4 6 1 14 10 11 3 9 7 12 2 13', 51),
+    ('15 14 6 7 10 1 0 11 12 8 4 9 2 5 13 3', 57),
+    ('11 14 13 1 2 3 12 4 15 7 9 5 10 6 8 0', 66),
+    ('6 13 3 2 11 9 5 10 1 7 12 14 8 4 0 15', 45),
+    ('4 6 12 0 14 2 9 13 11 8 3 15 7 10 1 5', 57),
+    ('8 10 9 11 14 1 7 15 13 4 0 12 6 2 5 3', 56),
+    ('5 2 14 0 7 8 6 3 11 12 13 15 4 10 9 1', 51),
+    ('7 8 3 2 10 12 4 6 11 13 5 15 0 1 9 14', 47),
+    ('11 6 14 12 3 5 1 15 8 0 10 13 9 7 4 2', 61),
+    ('7 1 2 4 8 3 6 11 10 15 0 5 14 12 13 9', 50),
+    ('7 3 1 13 12 10 5 2 8 0 6 11 14 15 4 9', 51),
+    ('6 0 5 15 1 14 4 9 2 13 8 10 11 12 7 3', 53),
+    ('15 1 3 12 4 0 6 5 2 8 14 9 13 10 7 11', 52),
+    ('5 7 0 11 12 1 9 10 15 6 2 3 8 4 13 14', 44),
+    ('12 15 11 10 4 5 14 0 13 7 1 2 9 8 3 6', 56),
+    ('6 14 10 5 15 8 7 1 3 4 2 0 12 9 11 13', 49),
+    ('14 13 4 11 15 8 6 9 0 7 3 1 2 10 12 5', 56),
+    ('14 4 0 10 6 5 1 3 9 2 13 15 12 7 8 11', 48),
+    ('15 10 8 3 0 6 9 5 1 14 13 11 7 2 12 4', 57),
+    ('0 13 2 4 12 14 6 9 15 1 10 3 11 5 8 7', 54),
+    ('3 14 13 6 4 15 8 9 5 12 10 0 2 7 1 11', 53),
+    ('0 1 9 7 11 13 5 3 14 12 4 2 8 6 10 15', 42),
+    ('11 0 15 8 13 12 3 5 10 1 4 6 14 9 7 2', 57),
+    ('13 0 9 12 11 6 3 5 15 8 1 10 4 14 2 7', 53),
+    ('14 10 2 1 13 9 8 11 7 3 6 12 15 5 4 0', 62),
+    ('12 3 9 1 4 5 10 2 6 11 15 0 14 7 13 8', 49),
+    ('15 8 10 7 0 12 14 1 5 9 6 3 13 11 4 2', 55),
+    ('4 7 13 10 1 2 9 6 12 8 14 5 3 0 11 15', 44),
+    ('6 0 5 10 11 12 9 2 1 7 4 3 14 8 13 15', 45),
+    ('9 5 11 10 13 0 2 1 8 6 14 12 4 7 3 15', 52),
+    ('15 2 12 11 14 13 9 5 1 3 8 7 0 10 6 4', 65),
+    ('11 1 7 4 10 13 3 8 9 14 0 15 6 5 2 12', 54),
+    ('5 4 7 1 11 12 14 15 10 13 8 6 2 0 9 3', 50),
+    ('9 7 5 2 14 15 12 10 11 3 6 1 8 13 0 4', 57),
+    ('3 2 7 9 0 15 12 4 6 11 5 14 8 13 10 1', 57),
+    ('13 9 14 6 12 8 1 2 3 4 0 7 5 10 11 15', 46),
+    ('5 7 11 8 0 14 9 13 10 12 3 15 6 1 4 2', 53),
+    ('4 3 6 13 7 15 9 0 10 5 8 11 2 12 1 14', 50),
+    ('1 7 15 14 2 6 4 9 12 11 13 3 0 8 5 10', 49),
+    ('9 14 5 7 8 15 1 2 10 4 13 6 12 0 11 3', 44),
+    ('0 11 3 12 5 2 1 9 8 10 14 15 7 4 13 6', 54),
+    ('7 15 4 0 10 9 2 5 12 11 13 6 1 3 14 8', 57),
+    ('11 4 0 8 6 10 5 13 12 7 14 3 1 2 9 15', 54),
+)
+
+# Packed board reached by a seeded walk of length moves from the goal that never undoes
+# its previous move
+def random_walk(length, size=4, seed=0):
+    puzzle = get_puzzle(size)
+    rng = random.Random(seed)
+    state = puzzle.goal
+    blank = puzzle.goal_positions[0]
+    prev = None
+    for _ in range(length):
+        target, prev = rng.choice(puzzle.pruned_moves[blank][prev])
+        state = puzzle.slide(state, blank, target)
+        blank = target
+    return state
+
+
+# (name, tier, tiles) of count walk instances per tier, seeded by seed, tier and index
+def generate_instances(tiers=('easy', 'medium'), count=5, size=4, seed=0):
+    puzzle = get_puzzle(size)
+    instances = []
+    for tier in tiers:
+        for i in range(count):
+            state = random_walk(TIERS[tier], puzzle, '%s-%s-%d' % (seed, tier, i))
+            instances.append(('%s-%d' % (tier, i + 1), tier, [int(tile) for tile in puzzle.unpack(state)]))
+    return instances
+
+
+# Converts a board from Korf's convention (goal: empty tile first, then 1 .. n-1) to ours
+# (1 .. n-1, then the empty tile). Rotating the board by 180 degrees and relabelling tile t
+# as n - t maps one goal onto the other and preserves solution lengths.
+def from_korf(tiles):
+    n = len(tiles)
+    return [n - tile if tile else 0 for tile in reversed(tiles)]
+
+
+# (name, tier, tiles) for every board of an instance file (see batch.read_boards). A line
+# may start with an instance number, e.g. "1 14 13 15 7 ..." in the Korf 100 listing.
+def load_instances(lines, tier='file', korf=False):
+    instances = []
+    for i, line in enumerate(read_boards(lines)):
+        tiles = [int(tile) for tile in line.split()]
+        name = '%s-%d' % (tier, i + 1)
+        if len(tiles) not in (9, 16, 25, 36) and len(tiles) - 1 in (9, 16, 25, 36):
+            name = '%s-%d' % (tier, tiles[0])
+            tiles = tiles[1:]
+        instances.append((name, tier, from_korf(tiles) if korf else tiles))
+    return instances
+
+
+# (name, tier, tiles) of the first count instances of the built-in Korf 100 set, in our
+# goal convention
+def korf_instances(count=len(KORF100)):
+    return [('korf-%d' % (i + 1), 'korf', from_korf([int(tile) for tile in tiles.split()]))
+            for i, (tiles, _) in enumerate(KORF100[:count])]
+
+
+# instance name -> published optimal solution length of the built-in Korf 100 set
+def korf_lengths():
+    return {'korf-%d' % (i + 1): length for i, (_, length) in enumerate(KORF100)}
+
+
+# Splits "astar:linear conflict" into ('astar', 'linear conflict')
+def parse_engine(spec):
+    algorithm, _, heuristic = spec.partition(':')
+    if algorithm not in ALGORITHMS:
+        raise ValueError("unknown engine %r, expected one of %s" % (algorithm, ', '.join(sorted(ALGORITHMS))))
+    return algorithm, heuristic or 'manhattan'
+
+
+# Runs every engine on every instance and returns one result dict per run. optimal maps
+# instance names to known optimal solution lengths, recorded with each result.
+def run_benchmark(instances, engines=DEFAULT_ENGINES, node_limit=1000000, time_limit=30, progress=None,
+                  optimal=None):
+    optimal = optimal or {}
+    results = []
+    for spec in engines:
+        algorithm, heuristic = parse_engine(spec)
+        for name, tier, tiles in instances:
+            record = solve_one(tiles, algorithm, heuristic, node_limit, time_limit)
+            stats = record.get('stats', {})
+            result = {
+                'instance': name,
+                'tier': tier,
+                'engine': spec,
+                'status': record['status'],
+                'length': record.get('length'),
+                'optimal': optimal.get(name),
+                'expanded': stats.get('expanded', record.get('expanded')),
+                'generated': stats.get('generated'),
+                'time': stats.get('elapsed', record.get('time')),
+                'expansions_per_second': stats.get('expansions_per_second'),
+                'peak_memory': stats.get('peak_memory'),
+            }
+            results.append(result)
+            if progress is not None:
+                progress(result)
+    return results
+
+
+# Text table with one row per engine and tier: solved count, mean solution length, total
+# and mean expanded nodes, total time and node rate
+def format_table(results):
+    groups = {}
+    for result in results:
+        groups.setdefault((result['engine'], result['tier']), []).append(result)
+    header = ('engine', 'tier', 'solved', 'mean len', 'expanded', 'mean exp', 'time (s)', 'exp/s')
+    rows = [header]
+    for (engine, tier), group in groups.items():
+        solved = [result for result in group if result['status'] == 'solved']
+        expanded = sum(result['expanded'] or 0 for result in group)
+        seconds = sum(result['time'] or 0 for result in group)
+        rows.append((
+            engine,
+            tier,
+            '%d/%d' % (len(solved), len(group)),
+            '%.1f' % (sum(result['length'] for result in solved) / len(solved)) if solved else '-',
+            str(expanded),
+            '%.0f' % (expanded / len(group)),
+            '%.3f' % seconds,
+            '%.0f' % (expanded / seconds) if seconds else '-',
+        ))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    lines = []
+    for n, row in enumerate(rows):
+        lines.append('  '.join(cell.ljust(width) if i < 2 else cell.rjust(width)
+                               for i, (cell, width) in enumerate(zip(row, widths))))
+        if n == 0:
+            lines.append('  '.join('-' * width for width in widths))
+    return '\n'.join(lines)
+
+
+def baseline_key(result):
+    return '%s|%s' % (result['engine'], result['instance'])
+
+
+def make_baseline(results):
+    return {baseline_key(result): {field: result[field] for field in ('status', 'length', 'expanded', 'time')}
+            for result in results}
+
+
+# Differences from a baseline that count as regressions, as readable strings.
+# expanded_tolerance and time_tolerance are allowed relative increases; time is only
+# checked when time_tolerance is given. A baseline without a solved run among these
+# results is a regression too, since nothing could be checked.
+def compare(results, baseline, expanded_tolerance=0.05, time_tolerance=None):
+    regressions = []
+    for result in results:
+        key = baseline_key(result)
+        old = baseline.get(key)
+        if old is None:
+            continue
+        if old['status'] == 'solved' and result['status'] != 'solved':
+            regressions.append('%s: was solved, now %s' % (key, result['status']))
+            continue
+        if result['status'] != 'solved':
+            continue
+        if old['length'] is not None and result['length'] != old['length']:
+            regressions.append('%s: solution length %s, baseline %s' % (key, result['length'], old['length']))
+        if old['expanded'] and result['expanded'] > old['expanded'] * (1 + expanded_tolerance):
+            regressions.append('%s: expanded %d nodes, baseline %d' % (key, result['expanded'], old['expanded']))
+        if (time_tolerance is not None and old['time'] and old['status'] == 'solved'
+                and result['time'] > old['time'] * (1 + time_tolerance)):
+            regressions.append('%s: took %.3fs, baseline %.3fs' % (key, result['time'], old['time']))
+    solved = [key for key in map(baseline_key, results) if baseline.get(key, {}).get('status') == 'solved']
+    if not solved:
+        regressions.append('the baseline solved none of these runs, there is nothing to compare against')
+    return regressions
+
+
+# (engine, tier, runs) of every engine and tier without a single solved run
+def unsolved_groups(results):
+    groups = {}
+    for result in results:
+        groups.setdefault((result['engine'], result['tier']), []).append(result['status'] == 'solved')
+    return [(engine, tier, len(solved)) for (engine, tier), solved in groups.items() if not any(solved)]
+
+
+# Solved runs whose solution length differs from the instance's known optimal length. Every
+# engine is optimal with an admissible heuristic, so these are bugs with or without a
+# baseline.
+def check_optimal(results):
+    return ['%s: solution length %s, optimal %s' % (baseline_key(result), result['length'], result['optimal'])
+            for result in results
+            if result['status'] == 'solved' and result.get('optimal') is not None
+            and result['length'] != result['optimal']]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the sliding puzzle solvers")
+    parser.add_argument('--tiers', nargs='*', default=['easy', 'medium'], choices=sorted(TIERS))
+    parser.add_argument('--count', type=int, default=5, help="random walk instances per tier")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--size', type=int, default=4, help="board width of the random walk instances")
+    parser.add_argument('--instances', help="file with extra boards, one per line")
+    parser.add_argument('--korf', help="file of boards in Korf's goal convention to run instead of the built-in "
+                                       "Korf 100 set")
+    parser.add_argument('--korf-count', type=int, default=0,
+                        help="number of built-in Korf 100 instances to run, up to %d" % len(KORF100))
+    parser.add_argument('--korf-engines', nargs='*', default=list(KORF_ENGINES),
+                        help="engines run on the Korf instances, e.g. idastar:pdb")
+    parser.add_argument('--engines', nargs='*', default=list(DEFAULT_ENGINES),
+                        help="engine or engine:heuristic, e.g. bfs astar:pdb 'idastar:linear conflict'")
+    parser.add_argument('--node-limit', type=int, default=1000000, help="node budget per run")
+    parser.add_argument('--time-limit', type=float, default=30, help="seconds per run")
+    parser.add_argument('--json', help="write every run's result to this file")
+    parser.add_argument('--write-baseline', help="save the results as a baseline to this file")
+    parser.add_argument('--baseline', help="compare against this baseline and exit 1 on a regression")
+    parser.add_argument('--expanded-tolerance', type=float, default=0.05)
+    parser.add_argument('--time-tolerance', type=float, default=None)
+    args = parser.parse_args(argv)
+
+    for spec in args.engines + args.korf_engines:
+        parse_engine(spec)
+    instances = generate_instances(args.tiers, args.count, args.size, args.seed)
+    if args.instances:
+        with open(args.instances) as f:
+            instances += load_instances(f, 'file')
+    optimal = {}
+    if args.korf:
+        with open(args.korf) as f:
+            korf = load_instances(f, 'korf', korf=True)
+    else:
+        korf = korf_instances(args.korf_count)
+        optimal = korf_lengths()
+
+    def progress(result):
+        print('%-24s %-12s %-16s %s' % (result['engine'], result['instance'], result['status'],
+                                       result['expanded']), file=sys.stderr, flush=True)
+
+    results = run_benchmark(instances, args.engines, args.node_limit, args.time_limit, progress)
+    results += run_benchmark(korf, args.korf_engines, args.node_limit, args.time_limit, progress, optimal)
+    print(format_table(results))
+    for engine, tier, runs in unsolved_groups(results):
+        print('warning: %s solved none of the %d %s instances, they give no regression signal'
+              % (engine, runs, tier), file=sys.stderr)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+    if args.write_baseline:
+        if not any(result['status'] == 'solved' for result in results):
+            sys.exit('error: no run was solved, not writing a baseline to %s' % args.write_baseline)
+        with open(args.write_baseline, 'w') as f:
+            json.dump(make_baseline(results), f, indent=1, sort_keys=True)
+    regressions = check_optimal(results)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions += compare(results, json.load(f), args.expanded_tolerance, args.time_tolerance)
+    if regressions:
+        print('\n%d regression(s):' % len(regressions))
+        for regression in regressions:
+            print('  ' + regression)
+        sys.exit(1)
+    if args.baseline:
+        print('\nno regressions against %s' % args.baseline)
+
+
+if __name__ == '__main__':
+    main()
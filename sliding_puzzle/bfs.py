@@ -0,0 +1,158 @@
+import sys
+import time
+
+from .arena import NodeStore
+from .domain import INVERSE, get_puzzle
+
+
+# Breadth first search over an arena NodeStore (see sliding_puzzle.arena).
+# The store doubles as the FIFO queue: nodes are appended in the order they are generated,
+# so expanding them by increasing index is breadth first order, and no queue entries or
+# per-node move lists are kept. seen holds the packed states already generated.
+#
+# Returns (path, number of expanded nodes, time taken, memory) or None if the node or
+# time limit runs out or the start cannot reach the goal. stats is an optional
+# sliding_puzzle.stats.SearchStats, sampled with the number of queued nodes.
+def breadth_first_search(start, size=4, node_limit=None, time_limit=None, stats=None):
+    start_time = time.time()
+    puzzle = get_puzzle(size)
+    goals = puzzle.goals
+    moves = puzzle.moves
+    store = NodeStore(puzzle)
+    states = store.states
+    blanks = store.blanks
+    costs = store.g
+    store.add(start, 0, blank=puzzle.find_blank(start))
+    seen = {start}
+    generated = 0
+    if stats is not None:
+        stats.phase('search')
+
+    head = 0
+    try:
+        while head < len(store):
+            state = states[head]
+            if state in goals:
+                memory = sys.getsizeof(seen) + store.nbytes()
+                if stats is not None:
+                    stats.phase('path')
+                return store.path(head), head, time.time() - start_time, memory
+            if node_limit is not None and head >= node_limit:
+                return None
+            if not head & 0xFFF:
+                if time_limit is not None and time.time() - start_time > time_limit:
+                    return None
+                if stats is not None:
+                    stats.expanded = head
+                    stats.generated = generated
+                    stats.sample(len(store) - head)
+
+            blank = blanks[head]
+            g = costs[head] + 1
+            generated += len(moves[blank])
+            for target, direction in moves[blank]:
+                child = puzzle.slide(state, blank, target)
+                if child not in seen:
+                    seen.add(child)
+                    store.add(child, g, head, direction, target)
+            head += 1
+        return None
+    finally:
+        if stats is not None:
+            stats.expanded = head
+            stats.generated = generated
+            stats.stop()
+
+
+# Bidirectional breadth first search between start and the goal (the backward search starts
+# from all goals of the puzzle at once).
+# Both searches keep a dictionary from every reached state to the single move that reached
+# it (None for their root). Instead of storing whole move lists per queue entry, the path
+# is rebuilt at the end by undoing those moves back from the meeting state. Each round
+# expands one whole layer of the smaller frontier; the shortest connection seen while
+# expanding that layer is the optimal path.
+#
+# Returns (path, number of states reached by both searches) or (None, count) if the
+# searches cannot meet. stats is an optional sliding_puzzle.stats.SearchStats, sampled
+# after every layer with the size of both frontiers.
+def bidirectional_bfs(start, size=4, stats=None):
+    if stats is None:
+        return _bidirectional_bfs(start, size, None)
+    stats.phase('search')
+    try:
+        return _bidirectional_bfs(start, size, stats)
+    finally:
+        stats.stop()
+
+
+def _bidirectional_bfs(start, size, stats):
+    puzzle = get_puzzle(size)
+    if start in puzzle.goals:
+        return [], 1
+    expanded = 0
+    generated = 0
+
+    forward = {start: None}
+    backward = dict.fromkeys(puzzle.goals)
+    forward_layer = [(start, puzzle.find_blank(start))]
+    backward_layer = [(puzzle.pack(layout), layout.index(0)) for layout in puzzle.goal_layouts]
+
+    while forward_layer and backward_layer:
+        expand_forward = len(forward_layer) <= len(backward_layer)
+        if expand_forward:
+            layer, reached, other = forward_layer, forward, backward
+        else:
+            layer, reached, other = backward_layer, backward, forward
+
+        next_layer = []
+        meeting = None
+        expanded += len(layer)
+        for state, blank in layer:
+            generated += len(puzzle.moves[blank])
+            for target, direction in puzzle.moves[blank]:
+                child = puzzle.slide(state, blank, target)
+                if child in reached:
+                    continue
+                reached[child] = direction
+                if child in other:
+                    # every state in the other search is at most one layer deeper than its
+                    # last finished layer, keep the connection through the shallowest one
+                    length = path_length(other, child, puzzle)
+                    if meeting is None or length < meeting[1]:
+                        meeting = (child, length)
+                next_layer.append((child, target))
+
+        if stats is not None:
+            stats.expanded = expanded
+            stats.generated = generated
+            stats.sample(len(next_layer) + len(backward_layer if expand_forward else forward_layer))
+        if meeting is not None:
+            if stats is not None:
+                stats.phase('path')
+            state = meeting[0]
+            path = trace(forward, state, puzzle) + [INVERSE[d] for d in reversed(trace(backward, state, puzzle))]
+            return path, len(forward) + len(backward)
+
+        if expand_forward:
+            forward_layer = next_layer
+        else:
+            backward_layer = next_layer
+
+    return None, len(forward) + len(backward)
+
+
+# Moves from the root of a search to state, found by undoing the recorded moves
+def trace(reached, state, size=4):
+    puzzle = get_puzzle(size)
+    path = []
+    while reached[state] is not None:
+        direction = reached[state]
+        path.append(direction)
+        blank = puzzle.find_blank(state)
+        state = puzzle.slide(state, blank, puzzle.move_target(blank, INVERSE[direction]))
+    path.reverse()
+    return path
+
+
+def path_length(reached, state, size=4):
+    return len(trace(reached, state, size))
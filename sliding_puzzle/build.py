@@ -0,0 +1,42 @@
+import argparse
+import os
+
+from .domain import get_puzzle
+from .pdb import DEFAULT_PARTITION, MAX_BUILD_BYTES, PARTITIONS, build_bytes, partition_patterns, pattern_path, save
+
+# Offline pattern database builds (see sliding_puzzle.pdb). Searches only load databases
+# from the cache, so build the partitions you search with once:
+#
+#   python -m sliding_puzzle.build --size 4                  # the default partition
+#   python -m sliding_puzzle.build --size 4 --partition 663
+#   python -m sliding_puzzle.build --size 4 --list           # what is built, what fits
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the pattern databases of a sliding puzzle")
+    parser.add_argument('--size', type=int, default=4, help="board width")
+    parser.add_argument('--height', type=int, default=None, help="board height (default: the width)")
+    parser.add_argument('--partition', default=None, help="partition name (default: the board's default)")
+    parser.add_argument('--goal', default=None, help="custom goal layout, e.g. '0 1 2 3 4 5 6 7 8'")
+    parser.add_argument('--directory', default=None, help="cache directory (default: SLIDING_PUZZLE_CACHE)")
+    parser.add_argument('--list', action='store_true', help="list the partitions and their state instead")
+    args = parser.parse_args(argv)
+
+    puzzle = get_puzzle(args.size, args.height, args.goal)
+    if args.list:
+        default = DEFAULT_PARTITION.get(puzzle.shape)
+        for name, patterns in PARTITIONS.get(puzzle.shape, {}).items():
+            print('%s%s' % (name, ' (default)' if name == default else ''))
+            for pattern in patterns:
+                needed = build_bytes(len(pattern), puzzle.cells)
+                state = ('built' if os.path.exists(pattern_path(pattern, puzzle, args.directory)) else
+                         'missing' if needed <= MAX_BUILD_BYTES else 'over the memory limit')
+                print('  %-40s %14d bytes to build  %s' % (' '.join(map(str, pattern)), needed, state))
+        return
+
+    for pattern in partition_patterns(puzzle, args.partition):
+        print('%s: %s' % (' '.join(map(str, pattern)), save(pattern, puzzle, args.directory)), flush=True)
+
+
+if __name__ == '__main__':
+    main()
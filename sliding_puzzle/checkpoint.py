@@ -0,0 +1,70 @@
+import os
+import pickle
+import time
+
+# Checkpoints for long searches (A*, IDA*, IDDFS).
+# A search given a checkpoint path saves its progress there every `every` seconds and
+# when its node or time budget runs out; started again with the same path it resumes from
+# the saved state instead of from zero, and removes the file once it finishes. What is
+# saved depends on the engine: the threshold and counters of the iterative deepening
+# searches, the node arena and the live frontier of A*.
+#
+# Every checkpoint records the kind of search and a key (start state, board size,
+# heuristic) so that a file is never resumed by a different search. Files are pickles
+# written to a temporary name and renamed, so a job killed while saving leaves the
+# previous checkpoint intact. Only load checkpoints you wrote yourself.
+
+VERSION = 1
+
+
+class Checkpoint:
+    def __init__(self, path, kind, key, every=60.0):
+        self.path = path
+        self.kind = kind
+        self.key = key
+        self.every = every
+        self.last = time.time()
+        self.saves = 0
+
+    # The saved data, or None if there is no checkpoint yet
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'rb') as f:
+            payload = pickle.load(f)
+        if payload.get('version') != VERSION or payload.get('kind') != self.kind or payload.get('key') != self.key:
+            raise ValueError("checkpoint %s belongs to a different search" % self.path)
+        return payload['data']
+
+    def due(self):
+        return time.time() - self.last >= self.every
+
+    def save(self, data):
+        payload = {'version': VERSION, 'kind': self.kind, 'key': self.key, 'data': data}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self.last = time.time()
+        self.saves += 1
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# Checkpoint for path, or None when checkpointing is off
+def open_checkpoint(path, kind, key, every=60.0):
+    if path is None:
+        return None
+    return Checkpoint(path, kind, key, every)
+
+
+# Name identifying a heuristic in checkpoint keys
+def heuristic_key(heuristic):
+    if isinstance(heuristic, str):
+        return heuristic
+    return '%s:%s' % (type(heuristic).__name__, getattr(heuristic, 'patterns', getattr(heuristic, 'name', None)))
@@ -0,0 +1,199 @@
+# Puzzle domain: everything that depends on the board dimensions, computed once per size.
+#
+# Tiles are packed into one integer with `bits` bits per cell: 4 bits up to 16 cells
+# (8- and 15-puzzle), 5 bits up to 32 cells (24-puzzle), 6 bits up to 64 cells
+# (35-puzzle). The engines, heuristics and pattern databases accept either a board width
+# (square boards) or a Puzzle wherever they take a size, and look up all tables here.
+#
+# Move generation is table driven: for every empty tile index the legal moves are a
+# precomputed tuple of (target index, direction), and pruned_moves additionally drops the
+# move that undoes the previous one, so a successor loop never tests board edges or
+# compares directions.
+#
+# The goal is part of the Puzzle: by default tiles 1 .. n-1 in order with the empty tile
+# last, but any layout, or a set of layouts, can be given. Each goal layout gets a
+# tile -> goal cell index, computed once and shared through get_puzzle() by every
+# heuristic and search on that goal, and goal tests are a set lookup of the packed
+# state. Puzzles with the same dimensions share their move tables.
+
+# direction -> (row change, column change) of the empty tile
+DIRECTIONS = {'U': (-1, 0), 'D': (1, 0), 'L': (0, -1), 'R': (0, 1)}
+
+# direction -> the direction that undoes it (None for the root, which has no previous move)
+INVERSE = {'U': 'D', 'D': 'U', 'L': 'R', 'R': 'L', None: None}
+
+
+# Bits per packed cell of a board with that many cells
+def cell_bits(cells):
+    return max(4, (cells - 1).bit_length())
+
+
+# Tiles 1 .. n-1 in order, the empty tile in the last cell
+def default_goal(cells):
+    return tuple(range(1, cells)) + (0,)
+
+
+def _is_layout(goal):
+    return isinstance(goal, str) or (len(goal) > 0 and isinstance(goal[0], (int, str)) and
+                                     not (isinstance(goal[0], str) and len(goal[0].split()) > 1))
+
+
+# Normalizes goals to a tuple of tile tuples: None (the default goal), one layout given as
+# "1 2 3 ..." or a sequence of tiles, or a sequence of such layouts
+def goal_layouts(goals, cells):
+    if goals is None:
+        return (default_goal(cells),)
+    if _is_layout(goals):
+        goals = [goals]
+    layouts = []
+    for goal in goals:
+        if isinstance(goal, str):
+            goal = goal.split()
+        try:
+            layout = tuple(int(tile) for tile in goal)
+        except ValueError:
+            raise ValueError("goal must contain only integers: %r" % (goal,))
+        if sorted(layout) != list(range(cells)):
+            raise ValueError("goal must contain each of the tiles 0 .. %d exactly once: %r" % (cells - 1, goal))
+        if layout not in layouts:
+            layouts.append(layout)
+    if not layouts:
+        raise ValueError("no goal given")
+    return tuple(layouts)
+
+
+_tables = {}
+
+
+# (moves, targets, pruned_moves, row_of, col_of) for a board shape, built once
+def move_tables(width, height):
+    tables = _tables.get((width, height))
+    if tables is not None:
+        return tables
+    cells = width * height
+    # empty tile index -> ((target index, direction), ...) of the legal moves
+    moves = []
+    for blank in range(cells):
+        row, col = divmod(blank, width)
+        legal = []
+        for direction in 'UDLR':
+            d_row, d_col = DIRECTIONS[direction]
+            if 0 <= row + d_row < height and 0 <= col + d_col < width:
+                legal.append(((row + d_row) * width + col + d_col, direction))
+        moves.append(tuple(legal))
+    moves = tuple(moves)
+    # empty tile index -> {direction: target index}
+    targets = tuple({direction: target for target, direction in legal} for legal in moves)
+    # empty tile index -> {previous direction: legal moves without the one undoing it}
+    pruned_moves = tuple({prev: tuple(move for move in legal if move[1] != INVERSE[prev])
+                          for prev in INVERSE} for legal in moves)
+    row_of = tuple(cell // width for cell in range(cells))
+    col_of = tuple(cell % width for cell in range(cells))
+    tables = _tables[(width, height)] = (moves, targets, pruned_moves, row_of, col_of)
+    return tables
+
+
+class Puzzle:
+    def __init__(self, width, height=None, goals=None):
+        if height is None:
+            height = width
+        if width < 2 or height < 2:
+            raise ValueError("puzzle must be at least 2x2, got %dx%d" % (width, height))
+        self.width = width
+        self.height = height
+        self.cells = width * height
+        self.bits = cell_bits(self.cells)
+        self.mask = (1 << self.bits) - 1
+
+        self.goal_layouts = goal_layouts(goals, self.cells)
+        self.standard_goal = self.goal_layouts == (default_goal(self.cells),)
+        # packed goals, a goal test is `state in goals`
+        self.goals = frozenset(self.pack(layout) for layout in self.goal_layouts)
+        # per goal layout: tile -> goal cell
+        self.goal_indexes = tuple(self.goal_index(layout) for layout in self.goal_layouts)
+        # the first goal, the only one in the usual single goal case
+        self.goal_tiles = self.goal_layouts[0]
+        self.goal = self.pack(self.goal_tiles)
+        self.goal_positions = self.goal_indexes[0]
+
+        self.moves, self.targets, self.pruned_moves, self.row_of, self.col_of = move_tables(width, height)
+
+    @property
+    def shape(self):
+        return (self.width, self.height)
+
+    # Identifies the puzzle in caches and checkpoints: the shape, plus the goals when
+    # they are not the default one
+    @property
+    def key(self):
+        if self.standard_goal:
+            return self.shape
+        return self.shape + (self.goal_layouts,)
+
+    # One single goal Puzzle per goal layout (the puzzle itself if it has one goal)
+    @property
+    def goal_puzzles(self):
+        if len(self.goal_layouts) == 1:
+            return (self,)
+        return tuple(get_puzzle(self.width, self.height, (layout,)) for layout in self.goal_layouts)
+
+    def goal_index(self, layout):
+        index = [0] * self.cells
+        for cell, tile in enumerate(layout):
+            index[tile] = cell
+        return tuple(index)
+
+    def is_goal(self, state):
+        return state in self.goals
+
+    def pack(self, tiles):
+        state = 0
+        for i, tile in enumerate(tiles):
+            state |= int(tile) << (self.bits * i)
+        return state
+
+    def unpack(self, state):
+        return [str((state >> (self.bits * i)) & self.mask) for i in range(self.cells)]
+
+    def tile_at(self, state, idx):
+        return (state >> (self.bits * idx)) & self.mask
+
+    def find_blank(self, state):
+        for i in range(self.cells):
+            if not (state >> (self.bits * i)) & self.mask:
+                return i
+        raise ValueError("board has no empty tile")
+
+    # Slides the tile at index target into the empty cell at index blank
+    def slide(self, state, blank, target):
+        tile = (state >> (self.bits * target)) & self.mask
+        return state - (tile << (self.bits * target)) + (tile << (self.bits * blank))
+
+    # Index the empty tile moves to, or None if the move leaves the board
+    def move_target(self, blank, direction):
+        return self.targets[blank].get(direction)
+
+    def __repr__(self):
+        if self.standard_goal:
+            return 'Puzzle(%d, %d)' % (self.width, self.height)
+        return 'Puzzle(%d, %d, goals=%r)' % (self.width, self.height, [list(layout) for layout in self.goal_layouts])
+
+
+_puzzles = {}
+
+
+# Returns the shared Puzzle for a width (and height) and goals (see goal_layouts), or the
+# Puzzle itself if given one
+def get_puzzle(width, height=None, goals=None):
+    if isinstance(width, Puzzle):
+        return width
+    height = height or width
+    key = (width, height)
+    if goals is not None:
+        layouts = goal_layouts(goals, width * height)
+        if layouts != (default_goal(width * height),):
+            key = (width, height, layouts)
+    puzzle = _puzzles.get(key)
+    if puzzle is None:
+        puzzle = _puzzles[key] = Puzzle(width, height, key[2] if len(key) > 2 else None)
+    return puzzle
@@ -0,0 +1,250 @@
+import argparse
+import bisect
+import heapq
+import mmap
+import os
+from array import array
+
+from .domain import INVERSE, get_puzzle
+
+# External memory breadth first search.
+# Every layer of the search lives on disk as a file of sorted, unique packed states (native
+# 64 bit unsigned integers), so RAM holds only one run buffer, never a visited set. In an
+# undirected graph the neighbours of layer d lie in layers d - 1, d and d + 1, so layer
+# d + 1 is the successors of layer d minus layers d and d - 1:
+#
+#   1. stream layer d from its memory mapped file and generate successors into a buffer
+#      of at most run_states states; every full buffer is sorted, deduplicated and
+#      written out as a run file
+#   2. k-way merge the runs (heapq.merge over memory mapped files), dropping duplicates
+#      and every state also found in the sorted streams of layers d and d - 1, and write
+#      the result as layer d + 1
+#
+# Run from the goal this enumerates the whole state space by distance, i.e. an exact
+# distance table for the puzzle class (distance() looks a state up by binary search in
+# the layer files). Run from a start it stops at the layer holding the target and
+# path_to() walks back through the layers: a predecessor of a state at depth d is the
+# neighbour found in layer d - 1.
+#
+# Boards must fit in 64 bits (4x4 and smaller). Layer files use the machine's byte order.
+# stats is an optional sliding_puzzle.stats.SearchStats, sampled once per layer with the
+# size of the new layer.
+
+CHUNK = 1 << 16
+
+
+# Sorted states of a layer or run file, streamed through a memory map
+def read_states(path):
+    if not os.path.getsize(path):
+        return
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        view = memoryview(m).cast('Q')
+        try:
+            for i in range(0, len(view), CHUNK):
+                yield from view[i:i + CHUNK].tolist()
+        finally:
+            view.release()
+
+
+def write_states(path, states):
+    count = 0
+    buffer = array('Q')
+    with open(path, 'wb') as f:
+        for state in states:
+            buffer.append(state)
+            if len(buffer) >= CHUNK:
+                buffer.tofile(f)
+                count += len(buffer)
+                buffer = array('Q')
+        buffer.tofile(f)
+    return count + len(buffer)
+
+
+def unique(states):
+    last = None
+    for state in states:
+        if state != last:
+            yield state
+            last = state
+
+
+# States of a sorted stream that are in none of the sorted exclude streams
+def difference(states, *excludes):
+    heads = []
+    for exclude in excludes:
+        heads.append([next(exclude, None), exclude])
+    for state in states:
+        found = False
+        for head in heads:
+            while head[0] is not None and head[0] < state:
+                head[0] = next(head[1], None)
+            if head[0] == state:
+                found = True
+        if not found:
+            yield state
+
+
+class ExternalBFS:
+    def __init__(self, start, size=4, directory='.', run_states=1 << 20, stats=None):
+        self.puzzle = get_puzzle(size)
+        if self.puzzle.cells * self.puzzle.bits > 64:
+            raise ValueError("external BFS stores 64 bit states, a %dx%d board does not fit" % self.puzzle.shape)
+        self.start = start
+        self.directory = directory
+        self.run_states = run_states
+        self.stats = stats
+        self.sizes = []
+        os.makedirs(directory, exist_ok=True)
+
+    def layer_path(self, depth):
+        return os.path.join(self.directory, 'layer-%04d.bin' % depth)
+
+    def layer(self, depth):
+        return read_states(self.layer_path(depth))
+
+    # Binary search of a layer file
+    def contains(self, depth, state):
+        path = self.layer_path(depth)
+        if depth < 0 or depth >= len(self.sizes) or not self.sizes[depth]:
+            return False
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            view = memoryview(m).cast('Q')
+            try:
+                i = bisect.bisect_left(view, state)
+                return i < len(view) and view[i] == state
+            finally:
+                view.release()
+
+    # Writes the layers up to max_depth, or until a layer holding one of targets or an empty
+    # layer. Returns the number of states in every layer.
+    def run(self, max_depth=None, targets=()):
+        if self.stats is not None:
+            self.stats.phase('search')
+        if not self.sizes:
+            self.sizes.append(write_states(self.layer_path(0), [self.start]))
+        while max_depth is None or len(self.sizes) <= max_depth:
+            depth = len(self.sizes) - 1
+            if not self.sizes[depth] or any(self.contains(depth, target) for target in targets):
+                break
+            self.sizes.append(self.expand(depth))
+            if self.stats is not None:
+                self.stats.expanded += self.sizes[depth]
+                self.stats.sample(self.sizes[-1])
+        if self.sizes and not self.sizes[-1]:
+            self.sizes.pop()
+            os.remove(self.layer_path(len(self.sizes)))
+        return self.sizes
+
+    # Builds layer depth + 1 from layer depth, returns its size
+    def expand(self, depth):
+        puzzle = self.puzzle
+        moves = puzzle.moves
+        bits = puzzle.bits
+        mask = puzzle.mask
+        runs = []
+        buffer = []
+        generated = 0
+        for state in self.layer(depth):
+            blank = puzzle.find_blank(state)
+            for target, _ in moves[blank]:
+                tile = (state >> (bits * target)) & mask
+                buffer.append(state - (tile << (bits * target)) + (tile << (bits * blank)))
+            if len(buffer) >= self.run_states:
+                generated += len(buffer)
+                runs.append(self.write_run(depth, len(runs), buffer))
+                buffer = []
+        if buffer or not runs:
+            runs.append(self.write_run(depth, len(runs), buffer))
+        if self.stats is not None:
+            self.stats.generated += generated + len(buffer)
+
+        merged = unique(heapq.merge(*[read_states(run) for run in runs]))
+        excludes = [self.layer(depth)]
+        if depth > 0:
+            excludes.append(self.layer(depth - 1))
+        count = write_states(self.layer_path(depth + 1), difference(merged, *excludes))
+        for run in runs:
+            os.remove(run)
+        return count
+
+    def write_run(self, depth, index, buffer):
+        buffer.sort()
+        path = os.path.join(self.directory, 'run-%04d-%04d.bin' % (depth + 1, index))
+        write_states(path, unique(buffer))
+        return path
+
+    # Depth of state in the layers written so far, or None
+    def distance(self, state):
+        for depth in range(len(self.sizes)):
+            if self.contains(depth, state):
+                return depth
+        return None
+
+    # Moves from the start to target, walking back through the layers
+    def path_to(self, target):
+        depth = self.distance(target)
+        if depth is None:
+            return None
+        if self.stats is not None:
+            self.stats.phase('path')
+        puzzle = self.puzzle
+        path = []
+        state = target
+        while depth > 0:
+            blank = puzzle.find_blank(state)
+            for cell, direction in puzzle.moves[blank]:
+                previous = puzzle.slide(state, blank, cell)
+                if self.contains(depth - 1, previous):
+                    # moving the empty tile in direction undoes the step taken from previous
+                    path.append(INVERSE[direction])
+                    state = previous
+                    depth -= 1
+                    break
+        path.reverse()
+        return path
+
+    def remove(self):
+        for depth in range(len(self.sizes)):
+            path = self.layer_path(depth)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+# Shortest path from start to the nearest goal of the puzzle with the external memory
+# search. Returns (path, number of states in all layers) or (None, count) if no goal is
+# reachable.
+def external_bfs(start, size=4, directory='.', run_states=1 << 20, keep=False, stats=None):
+    search = ExternalBFS(start, size, directory, run_states, stats)
+    goals = search.puzzle.goals
+    try:
+        sizes = search.run(targets=goals)
+        reached = [goal for goal in goals if search.contains(len(sizes) - 1, goal)]
+        return (search.path_to(reached[0]) if reached else None), sum(sizes)
+    finally:
+        if stats is not None:
+            stats.stop()
+        if not keep:
+            search.remove()
+
+
+# Enumerates a puzzle class layer by layer from the goal and prints the layer sizes; the
+# layer files left in --directory are the distance table.
+#
+#   python -m sliding_puzzle.external --size 3 --directory layers
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Disk-backed breadth first enumeration of a sliding puzzle")
+    parser.add_argument('--size', type=int, default=3, help="board width")
+    parser.add_argument('--directory', default='layers', help="where the layer files are written")
+    parser.add_argument('--max-depth', type=int, default=None)
+    parser.add_argument('--run-states', type=int, default=1 << 20, help="states sorted in memory at a time")
+    args = parser.parse_args(argv)
+
+    search = ExternalBFS(get_puzzle(args.size).goal, args.size, args.directory, args.run_states)
+    sizes = search.run(args.max_depth)
+    for depth, count in enumerate(sizes):
+        print('%4d %12d' % (depth, count))
+    print('total %d states, %d layers' % (sum(sizes), len(sizes)))
+
+
+if __name__ == '__main__':
+    main()
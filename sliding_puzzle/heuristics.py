@@ -0,0 +1,221 @@
+import bisect
+import functools
+
+from .domain import get_puzzle
+from .pdb import PARTITIONS, PatternDatabaseHeuristic
+
+# Heuristics evaluated on packed states.
+# Every heuristic precomputes a cost table indexed [tile][cell] for its puzzle size, so a
+# full evaluation is one table lookup per cell. Only one tile moves per action, which lets
+# the search engines derive a child's value from its parent's with update() instead of
+# re-evaluating the whole board. size is a board width or a sliding_puzzle.domain.Puzzle.
+#
+# Tables are built against the puzzle's goal index (see sliding_puzzle.domain), so custom
+# goal layouts work unchanged. For a puzzle with several goals get_heuristic() returns the
+# minimum over one heuristic per goal, which stays admissible.
+
+
+# Goal position table: entry t is the index tile t occupies in the goal
+# (by default tiles 1 .. n-1 in order, the empty tile in the last cell)
+def goal_positions(size=4):
+    return get_puzzle(size).goal_positions
+
+
+def single_goal(puzzle):
+    if len(puzzle.goals) > 1:
+        raise ValueError("%r has several goals, build its heuristics with get_heuristic()" % puzzle)
+    return puzzle
+
+
+class TableHeuristic:
+    name = None
+
+    def __init__(self, size=4):
+        self.puzzle = puzzle = single_goal(get_puzzle(size))
+        self.width = puzzle.width
+        self.height = puzzle.height
+        self.cells = puzzle.cells
+        self.bits = puzzle.bits
+        self.mask = puzzle.mask
+        goal = puzzle.goal_positions
+        # the empty tile never contributes
+        self.cost = ((0,) * self.cells,) + tuple(
+            tuple(self.tile_cost(i, goal[tile]) for i in range(self.cells)) for tile in range(1, self.cells))
+
+    def tile_cost(self, cell, goal_cell):
+        raise NotImplementedError
+
+    def evaluate(self, state):
+        cost = self.cost
+        bits = self.bits
+        mask = self.mask
+        total = 0
+        for i in range(self.cells):
+            total += cost[(state >> (bits * i)) & mask][i]
+        return total
+
+    # Value after tile moved from cell source to cell dest, given the value h before the move.
+    # state is the board after the move, only needed by heuristics that look at several tiles
+    def update(self, h, tile, source, dest, state=None):
+        cost = self.cost[tile]
+        return h - cost[source] + cost[dest]
+
+    def __call__(self, state):
+        return self.evaluate(state)
+
+
+# Sum of the horizontal and vertical distances of every tile from its goal cell
+class Manhattan(TableHeuristic):
+    name = 'manhattan'
+
+    def tile_cost(self, cell, goal_cell):
+        row, col = divmod(cell, self.width)
+        goal_row, goal_col = divmod(goal_cell, self.width)
+        return abs(row - goal_row) + abs(col - goal_col)
+
+
+# Number of tiles (the empty tile excluded) that are not in their goal cell
+class Misplaced(TableHeuristic):
+    name = 'misplaced'
+
+    def tile_cost(self, cell, goal_cell):
+        return int(cell != goal_cell)
+
+
+# Manhattan distance plus 2 for every tile that has to leave its row or column to let
+# another tile in the same line past it. Two tiles are in conflict when both are in their
+# goal line but in reversed order; the fewest tiles that must leave a line is its length
+# minus the longest increasing run of goal positions.
+class LinearConflict(Manhattan):
+    name = 'linear conflict'
+
+    def __init__(self, size=4):
+        super().__init__(size)
+        goal = self.puzzle.goal_positions
+        width, height = self.width, self.height
+        self.goal_row = [goal[tile] // width for tile in range(self.cells)]
+        self.goal_col = [goal[tile] % width for tile in range(self.cells)]
+        self.row_cells = [tuple(row * width + col for col in range(width)) for row in range(height)]
+        self.col_cells = [tuple(row * width + col for row in range(height)) for col in range(width)]
+        self.row_mask = (1 << (self.bits * width)) - 1
+        self.row_memo = [{} for _ in range(height)]
+        self.col_memo = [{} for _ in range(width)]
+
+    def line_conflicts(self, state, cells, line, goal_line, goal_other):
+        order = []
+        for cell in cells:
+            tile = (state >> (self.bits * cell)) & self.mask
+            if tile and goal_line[tile] == line:
+                order.append(goal_other[tile])
+        if len(order) < 2:
+            return 0
+        tails = []
+        for value in order:
+            i = bisect.bisect_left(tails, value)
+            if i == len(tails):
+                tails.append(value)
+            else:
+                tails[i] = value
+        return 2 * (len(order) - len(tails))
+
+    # Conflicts of a row or column depend only on the tiles in it, so they are memoized on
+    # the packed contents of the line
+    def row_conflicts(self, state, row):
+        key = (state >> (self.bits * self.width * row)) & self.row_mask
+        memo = self.row_memo[row]
+        value = memo.get(key)
+        if value is None:
+            value = memo[key] = self.line_conflicts(state, self.row_cells[row], row, self.goal_row, self.goal_col)
+        return value
+
+    def col_conflicts(self, state, col):
+        key = 0
+        for cell in self.col_cells[col]:
+            key = (key << self.bits) | ((state >> (self.bits * cell)) & self.mask)
+        memo = self.col_memo[col]
+        value = memo.get(key)
+        if value is None:
+            value = memo[key] = self.line_conflicts(state, self.col_cells[col], col, self.goal_col, self.goal_row)
+        return value
+
+    def evaluate(self, state):
+        total = super().evaluate(state)
+        for row in range(self.height):
+            total += self.row_conflicts(state, row)
+        for col in range(self.width):
+            total += self.col_conflicts(state, col)
+        return total
+
+    # A vertical move only changes the two rows involved, a horizontal move the two columns
+    def update(self, h, tile, source, dest, state=None):
+        cost = self.cost[tile]
+        h = h - cost[source] + cost[dest]
+        before = state - (tile << (self.bits * dest)) + (tile << (self.bits * source))
+        source_row, source_col = divmod(source, self.width)
+        dest_row, dest_col = divmod(dest, self.width)
+        if source_row != dest_row:
+            for row in (source_row, dest_row):
+                h += self.row_conflicts(state, row) - self.row_conflicts(before, row)
+        else:
+            for col in (source_col, dest_col):
+                h += self.col_conflicts(state, col) - self.col_conflicts(before, col)
+        return h
+
+
+# Smallest value of one heuristic per goal of a multi goal puzzle. The parts cannot be
+# recovered from the combined value, so update() evaluates the new board in full.
+class MultiGoalHeuristic:
+    def __init__(self, parts):
+        self.parts = tuple(parts)
+        self.name = self.parts[0].name
+
+    def evaluate(self, state):
+        return min(part.evaluate(state) for part in self.parts)
+
+    def update(self, h, tile, source, dest, state):
+        return self.evaluate(state)
+
+    def __call__(self, state):
+        return self.evaluate(state)
+
+
+HEURISTICS = {
+    'manhattan': Manhattan,
+    'linear conflict': LinearConflict,
+    'linear-conflict': LinearConflict,
+    'misplaced': Misplaced,
+    'misplaced tiles': Misplaced,
+    # additive pattern databases, the default partition for the board size or a named one
+    'pdb': PatternDatabaseHeuristic,
+}
+for _size, _partitions in PARTITIONS.items():
+    for _name in _partitions:
+        HEURISTICS['pdb-' + _name] = functools.partial(PatternDatabaseHeuristic, partition=_name)
+
+_instances = {}
+
+
+# Returns the shared heuristic instance for a name and puzzle (size and goals), building
+# its tables once; puzzles with the same goal reuse them
+def get_heuristic(name, size=4):
+    puzzle = get_puzzle(size)
+    heuristic = _instances.get((name, puzzle.key))
+    if heuristic is None:
+        try:
+            cls = HEURISTICS[name]
+        except KeyError:
+            raise ValueError("unknown heuristic %r, expected one of %s" % (name, ', '.join(sorted(HEURISTICS))))
+        if len(puzzle.goals) > 1:
+            heuristic = MultiGoalHeuristic(get_heuristic(name, goal) for goal in puzzle.goal_puzzles)
+        else:
+            heuristic = cls(puzzle)
+        _instances[(name, puzzle.key)] = heuristic
+    return heuristic
+
+
+def manhattan(state, size=4):
+    return get_heuristic('manhattan', size).evaluate(state)
+
+
+def misplaced(state, size=4):
+    return get_heuristic('misplaced', size).evaluate(state)
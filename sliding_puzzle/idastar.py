@@ -0,0 +1,415 @@
+import concurrent.futures
+import multiprocessing
+import os
+import sys
+import time
+
+from .checkpoint import heuristic_key, open_checkpoint
+from .domain import get_puzzle
+from .heuristics import get_heuristic
+
+FOUND = -1
+
+
+# Raised inside the depth first search when the node or time budget is used up. On its
+# way out every level of the search adds the smallest f it had found so far to minima
+# (innermost first), which is what a resumed search needs besides the path.
+class SearchAborted(Exception):
+    def __init__(self):
+        super().__init__()
+        self.minima = []
+
+
+# (target index, direction) of every legal move of the empty tile, per empty tile index
+def move_list(size=4):
+    return get_puzzle(size).moves
+
+
+# One f-bounded depth first search, shared by the serial and the parallel IDA*.
+# The search keeps one packed board that is moved forward before each recursive call and
+# back after it, the only other storage is the list of moves on the current path, so
+# memory is O(depth). Moves that undo the previous move are never generated. h is carried
+# down the path and updated per move; the moves of a node come from the puzzle's
+# pruned move table (see sliding_puzzle.domain). deadline is an absolute time.time() value and stop
+# an optional event (e.g. multiprocessing.Event) that aborts the search when set.
+#
+# With a TranspositionTable (see sliding_puzzle.transposition) states already searched in
+# this iteration from the same or a smaller depth are cut off with the bound their first
+# search returned. stats is an optional sliding_puzzle.stats.SearchStats, sampled with
+# the length of the current path.
+#
+# refill is an optional callable that is asked for more nodes when node_limit is reached
+# (the parallel search hands out a shared budget in chunks); it returns how many, 0 to
+# abort.
+#
+# resume is an optional (path, minima) of an aborted run with the same bound: the search
+# walks straight down path, skipping the moves searched before it at every level and
+# starting from that level's minimum, and expands the node at its end again.
+class BoundedSearch:
+    def __init__(self, heuristic, size=4, node_limit=None, deadline=None, stop=None, table=None, stats=None,
+                 refill=None):
+        self.heuristic = heuristic
+        self.puzzle = get_puzzle(size)
+        self.goals = self.puzzle.goals
+        self.moves = self.puzzle.pruned_moves
+        self.node_limit = node_limit
+        self.deadline = deadline
+        self.stop = stop
+        self.table = table
+        self.stats = stats
+        self.refill = refill
+        self.nodes = 0
+        self.generated = 0
+        self.path = []
+
+    # Returns FOUND (the moves are in self.path) or the smallest f that exceeded bound
+    def run(self, state, blank, g, h, prev, bound, resume=None):
+        goals = self.goals
+        moves = self.moves
+        bits = self.puzzle.bits
+        mask = self.puzzle.mask
+        update = self.heuristic.update
+        path = self.path
+        node_limit = self.node_limit
+        deadline = self.deadline
+        stop = self.stop
+        table = self.table
+        stats = self.stats
+        if table is not None:
+            table.new_iteration()
+
+        def search(state, blank, g, h, prev):
+            nonlocal node_limit
+            f = g + h
+            if table is not None:
+                known = table.probe(state, g)
+                if known is not None:
+                    return g + known
+            if f > bound:
+                return f
+            if state in goals:
+                return FOUND
+            self.nodes += 1
+            if node_limit is not None and self.nodes > node_limit:
+                node_limit = self.extend()
+            if not self.nodes & 0xFFF:
+                if deadline is not None and time.time() > deadline:
+                    raise SearchAborted
+                if stop is not None and stop.is_set():
+                    raise SearchAborted
+                if stats is not None:
+                    stats.expanded = self.nodes
+                    stats.generated = self.generated
+                    stats.sample(len(path))
+            minimum = float('inf')
+            self.generated += len(moves[blank][prev])
+            for target, direction in moves[blank][prev]:
+                tile = (state >> (bits * target)) & mask
+                delta = (tile << (bits * blank)) - (tile << (bits * target))
+                state += delta # make the move
+                path.append(direction)
+                try:
+                    t = search(state, target, g + 1, update(h, tile, target, blank, state), direction)
+                except SearchAborted as e:
+                    e.minima.append(minimum)
+                    raise
+                if t == FOUND:
+                    return FOUND
+                path.pop()
+                state -= delta # unmake it
+                if t < minimum:
+                    minimum = t
+            if table is not None:
+                table.store(state, g, minimum - g if minimum != float('inf') else 0xFF)
+            return minimum
+
+        # search() along the path of an aborted run, whose nodes are already counted
+        def descend(state, blank, g, h, prev, level):
+            if level == len(resume_path):
+                return search(state, blank, g, h, prev)
+            minimum = resume_minima[level]
+            options = moves[blank][prev]
+            skip = [direction for _, direction in options].index(resume_path[level])
+            for i, (target, direction) in enumerate(options[skip:]):
+                tile = (state >> (bits * target)) & mask
+                delta = (tile << (bits * blank)) - (tile << (bits * target))
+                state += delta
+                path.append(direction)
+                child_h = update(h, tile, target, blank, state)
+                try:
+                    if i:
+                        t = search(state, target, g + 1, child_h, direction)
+                    else:
+                        t = descend(state, target, g + 1, child_h, direction, level + 1)
+                except SearchAborted as e:
+                    e.minima.append(minimum)
+                    raise
+                if t == FOUND:
+                    return FOUND
+                path.pop()
+                state -= delta
+                if t < minimum:
+                    minimum = t
+            if table is not None:
+                table.store(state, g, minimum - g if minimum != float('inf') else 0xFF)
+            return minimum
+
+        if resume is None:
+            return search(state, blank, g, h, prev)
+        resume_path, resume_minima = resume
+        return descend(state, blank, g, h, prev, 0)
+
+    # A larger node limit from refill, or SearchAborted
+    def extend(self):
+        grant = self.refill() if self.refill is not None else 0
+        if not grant:
+            raise SearchAborted
+        self.node_limit += grant
+        return self.node_limit
+
+
+# Iterative deepening A*.
+# Every iteration is a depth first search bounded by f = g + h (see BoundedSearch); the
+# next bound is the smallest f that exceeded the current one. table is an optional
+# TranspositionTable that trades its fixed memory for fewer re-expanded states.
+#
+# With a checkpoint path (see sliding_puzzle.checkpoint) the current bound, the finished
+# iterations and the node counters are saved at iteration boundaries (at most every
+# checkpoint_every seconds) and when a budget runs out, then together with the position in
+# the interrupted iteration (the moves to the node it stopped at and the smallest f found
+# so far at every level, see BoundedSearch). A later call with the same start, size,
+# heuristic and path carries on from that node, so every call makes progress however small
+# its budget. time_limit and node_limit apply to each call; the reported counts cover all
+# of them.
+#
+# Returns (path, number of expanded nodes, time taken, memory, iterations) where
+# iterations is a list of (threshold, nodes expanded with that threshold). Returns None if
+# the node or time limit runs out.
+def idastar(start, heuristic='linear conflict', size=4, node_limit=None, time_limit=None, table=None, stats=None,
+            checkpoint=None, checkpoint_every=60.0):
+    if stats is not None:
+        stats.phase('setup')
+    saver = open_checkpoint(checkpoint, 'idastar', (start, get_puzzle(size).key, heuristic_key(heuristic)),
+                            checkpoint_every)
+    if isinstance(heuristic, str):
+        heuristic = get_heuristic(heuristic, size)
+    start_time = time.time()
+    deadline = None if time_limit is None else start_time + time_limit
+    searcher = BoundedSearch(heuristic, size, node_limit, deadline, table=table, stats=stats)
+    iterations = []
+
+    h = heuristic.evaluate(start)
+    blank = searcher.puzzle.find_blank(start)
+    bound = h
+    nodes = generated = 0 # from earlier calls
+    position = None # where an earlier call stopped in the current iteration
+    resumed = saver.load() if saver is not None else None
+    if resumed is not None:
+        bound = resumed['bound']
+        iterations = resumed['iterations']
+        nodes = resumed['nodes']
+        generated = resumed['generated']
+        start_time -= resumed['elapsed']
+        position = resumed.get('position')
+
+    def save(position=None):
+        saver.save({'bound': bound, 'iterations': iterations, 'nodes': nodes + searcher.nodes,
+                    'generated': generated + searcher.generated, 'elapsed': time.time() - start_time,
+                    'position': position})
+
+    if stats is not None:
+        stats.phase('search')
+    try:
+        while True:
+            before = searcher.nodes
+            carried = 0 # nodes of this iteration expanded by earlier calls
+            resume = None
+            if position is not None:
+                carried = position['nodes']
+                resume = position['path'], position['minima']
+                position = None
+            elif saver is not None and saver.due():
+                save()
+            t = searcher.run(start, blank, 0, h, None, bound, resume)
+            iterations.append((bound, searcher.nodes - before + carried))
+            if t == FOUND:
+                memory = sys.getsizeof(searcher.path) + sys.getsizeof(iterations)
+                if saver is not None:
+                    saver.remove()
+                return list(searcher.path), nodes + searcher.nodes, time.time() - start_time, memory, iterations
+            if t == float('inf'):
+                if saver is not None:
+                    saver.remove()
+                return None
+            bound = t
+    except SearchAborted as e:
+        if saver is not None:
+            searcher.nodes -= 1 # the node it stopped at is expanded again on resume
+            save({'path': list(searcher.path), 'minima': e.minima[::-1], 'nodes': searcher.nodes - before + carried})
+        return None
+    finally:
+        if stats is not None:
+            stats.expanded = nodes + searcher.nodes
+            stats.generated = generated + searcher.generated
+            stats.stop()
+
+
+# Parallel IDA*.
+# The tree is cut at a shallow depth into many more subtrees than workers. Every iteration
+# submits all subtrees with the same threshold to a process pool; an idle worker simply
+# takes the next subtree, so fast and slow subtrees balance out. As soon as one worker
+# finds a solution within the threshold it sets a shared event and the others abandon
+# their subtrees. Any solution found at the current threshold is optimal, since every
+# smaller threshold was searched completely.
+#
+# Returns the same tuple as idastar; nodes are summed over the workers. With stats, node
+# counts cover all workers but memory is measured in the coordinating process only, and
+# the frontier is sampled once per iteration with the number of subtrees.
+#
+# node_limit is one budget for the whole search, shared by the workers: a subtree takes up
+# to BUDGET_CHUNK nodes at a time from a shared counter and gives back what it did not use.
+# A subtree that finds the budget empty stops all the others, since the iteration cannot
+# be completed any more.
+
+BUDGET_CHUNK = 4096
+
+_stop_event = None
+_budget = None # multiprocessing.Value of nodes not handed out yet, None without a node limit
+
+
+def _init_worker(stop, budget):
+    global _stop_event, _budget
+    _stop_event = stop
+    _budget = budget
+
+
+def _take_budget():
+    with _budget.get_lock():
+        # smaller chunks as the budget runs low, so little is held back by running subtrees
+        grant = min(BUDGET_CHUNK, _budget.value // 8 or _budget.value)
+        _budget.value -= grant
+    if not grant:
+        _stop_event.set()
+    return grant
+
+
+# Searches one subtree with the iteration's threshold.
+# Returns (moves below the subtree root or None, next threshold, nodes, generated nodes, aborted)
+def _search_subtree(state, blank, g, prev, heuristic, size, bound, deadline):
+    if _stop_event.is_set():
+        return None, float('inf'), 0, 0, True
+    if _budget is None:
+        searcher = BoundedSearch(get_heuristic(heuristic, size), size, None, deadline, _stop_event)
+    else:
+        searcher = BoundedSearch(get_heuristic(heuristic, size), size, 0, deadline, _stop_event, refill=_take_budget)
+    try:
+        t = searcher.run(state, blank, g, searcher.heuristic.evaluate(state), prev, bound)
+    except SearchAborted:
+        return None, float('inf'), searcher.nodes, searcher.generated, True
+    finally:
+        if _budget is not None and searcher.node_limit > searcher.nodes:
+            with _budget.get_lock():
+                _budget.value += searcher.node_limit - searcher.nodes
+    if t == FOUND:
+        _stop_event.set()
+        return searcher.path, bound, searcher.nodes, searcher.generated, False
+    return None, t, searcher.nodes, searcher.generated, False
+
+
+# Unique states at depth `depth` below start as (state, blank, moves from start), or
+# the moves of a solution shallower than that
+def split_tree(start, size, depth):
+    puzzle = get_puzzle(size)
+    goals = puzzle.goals
+    layer = [(start, puzzle.find_blank(start), [])]
+    seen = {start}
+    for _ in range(depth):
+        next_layer = []
+        for state, blank, prefix in layer:
+            if state in goals:
+                return None, prefix
+            for target, direction in puzzle.pruned_moves[blank][prefix[-1] if prefix else None]:
+                child = puzzle.slide(state, blank, target)
+                if child not in seen:
+                    seen.add(child)
+                    next_layer.append((child, target, prefix + [direction]))
+        layer = next_layer
+    for state, blank, prefix in layer:
+        if state in goals:
+            return None, prefix
+    return layer, None
+
+
+def parallel_idastar(start, heuristic='linear conflict', size=4, workers=None, split_depth=None,
+                     node_limit=None, time_limit=None, stats=None):
+    if not isinstance(heuristic, str):
+        raise TypeError("parallel_idastar takes a heuristic name, workers build their own tables")
+    if stats is not None:
+        stats.phase('setup')
+    try:
+        return _parallel_idastar(start, heuristic, size, workers, split_depth, node_limit, time_limit, stats)
+    finally:
+        if stats is not None:
+            stats.stop()
+
+
+def _parallel_idastar(start, heuristic, size, workers, split_depth, node_limit, time_limit, stats):
+    start_time = time.time()
+    deadline = None if time_limit is None else start_time + time_limit
+    workers = workers or os.cpu_count() or 1
+
+    if split_depth is None:
+        # deep enough to give every worker a good number of subtrees to choose from
+        split_depth = 1
+        while 3 ** split_depth < workers * 16:
+            split_depth += 1
+    roots, solution = split_tree(start, size, split_depth)
+    if solution is not None:
+        return solution, 0, time.time() - start_time, sys.getsizeof(solution), []
+
+    h = get_heuristic(heuristic, size)
+    bound = min(len(prefix) + h.evaluate(state) for state, blank, prefix in roots)
+    iterations = []
+    nodes = 0
+    generated = 0
+    stop = multiprocessing.Event()
+    budget = None if node_limit is None else multiprocessing.Value('q', node_limit)
+    if stats is not None:
+        stats.phase('search')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                initargs=(stop, budget)) as pool:
+        while True:
+            stop.clear()
+            futures = {pool.submit(_search_subtree, state, blank, len(prefix), prefix[-1], heuristic, size,
+                                   bound, deadline): prefix
+                       for state, blank, prefix in roots}
+            found = None
+            aborted = False
+            next_bound = float('inf')
+            iteration_nodes = 0
+            for future in concurrent.futures.as_completed(futures):
+                if future.cancelled():
+                    continue
+                path, t, subtree_nodes, subtree_generated, subtree_aborted = future.result()
+                iteration_nodes += subtree_nodes
+                generated += subtree_generated
+                if path is not None and found is None:
+                    found = futures[future] + path
+                    for other in futures:
+                        other.cancel()
+                aborted = aborted or subtree_aborted
+                if t < next_bound:
+                    next_bound = t
+            nodes += iteration_nodes
+            iterations.append((bound, iteration_nodes))
+            if stats is not None:
+                stats.expanded = nodes
+                stats.generated = generated
+                stats.sample(len(roots))
+            if found is not None:
+                memory = sys.getsizeof(roots) + sys.getsizeof(found) + sys.getsizeof(iterations)
+                return found, nodes, time.time() - start_time, memory, iterations
+            # a subtree that ran out of budget leaves the next threshold unknown
+            if aborted or next_bound == float('inf'):
+                return None
+            bound = next_bound
@@ -0,0 +1,189 @@
+import sys
+import time
+
+from .checkpoint import open_checkpoint
+from .domain import get_puzzle
+
+
+# Yields (child state, empty tile index, direction) for every legal move except the one
+# that undoes the previous move
+def successors(state, blank, prev, puzzle):
+    bits = puzzle.bits
+    mask = puzzle.mask
+    for target, direction in puzzle.pruned_moves[blank][prev]:
+        tile = (state >> (bits * target)) & mask
+        yield state - (tile << (bits * target)) + (tile << (bits * blank)), target, direction
+
+
+# (stack, states) of a depth limited search that just stepped down path from start: every
+# level's successor generator has yielded the move on path, the last one nothing yet
+def resume_stack(start, blank, path, puzzle):
+    stack = []
+    states = [start]
+    state, prev = start, None
+    for move in path:
+        generator = successors(state, blank, prev, puzzle)
+        for state, blank, direction in generator:
+            if direction == move:
+                break
+        stack.append(generator)
+        states.append(state)
+        prev = move
+    stack.append(successors(state, blank, prev, puzzle))
+    return stack, states
+
+
+# Iterative deepening depth first search.
+# Each depth limited search walks the tree with an explicit stack of successor generators,
+# so only the current path is ever alive: one generator and one move per level. Memory is
+# sampled from that stack every sample_every nodes (and whenever it reaches a new depth)
+# instead of building whole layers.
+# table is an optional TranspositionTable (see sliding_puzzle.transposition).
+#
+# Returns (path, number of expanded nodes, time taken, memory, iterations) where every
+# iteration is a dict with its depth limit, expanded nodes, nodes generated at each depth,
+# effective branching factor (nodes / nodes of the previous iteration) and peak sampled
+# memory. Returns None if max_depth, node_limit or time_limit runs out.
+# stats is an optional sliding_puzzle.stats.SearchStats, sampled with the stack depth.
+# With a checkpoint path (see sliding_puzzle.checkpoint) the depth limit, finished
+# iterations and counters are saved between iterations (at most every checkpoint_every
+# seconds) and when a budget runs out, then together with the moves to the node the
+# interrupted iteration stopped at and its counters; a later call with the same start,
+# size and path carries on from that node. node_limit and time_limit apply to each call.
+def iddfs(start, size=4, max_depth=None, node_limit=None, time_limit=None, table=None, sample_every=1024,
+          stats=None, checkpoint=None, checkpoint_every=60.0):
+    saver = open_checkpoint(checkpoint, 'iddfs', (start, get_puzzle(size).key), checkpoint_every)
+    if stats is None:
+        return _iddfs(start, size, max_depth, node_limit, time_limit, table, sample_every, None, saver)
+    stats.phase('search')
+    try:
+        return _iddfs(start, size, max_depth, node_limit, time_limit, table, sample_every, stats, saver)
+    finally:
+        stats.stop()
+
+
+def _iddfs(start, size, max_depth, node_limit, time_limit, table, sample_every, stats, saver):
+    start_time = time.time()
+    puzzle = get_puzzle(size)
+    goals = puzzle.goals
+    iterations = []
+    expanded_node = 0
+    generated = 0
+    memory_consumed = 0
+    if start in goals:
+        return [], 0, 0.0, 0, iterations
+    blank = puzzle.find_blank(start)
+
+    limit = 0
+    position = None # where an earlier call stopped in the iteration after the finished ones
+    resumed = saver.load() if saver is not None else None
+    if resumed is not None:
+        limit = resumed['limit']
+        iterations = resumed['iterations']
+        expanded_node = resumed['expanded']
+        generated = resumed['generated']
+        memory_consumed = resumed['memory']
+        start_time -= resumed['elapsed']
+        position = resumed.get('position')
+    run_start = time.time()
+    run_expanded = expanded_node + (position['nodes'] if position is not None else 0)
+
+    # the finished iterations and, when the current one is interrupted, its position
+    def save(position=None):
+        saver.save({'limit': limit - 1, 'iterations': iterations, 'expanded': expanded_node,
+                    'generated': generated, 'memory': memory_consumed, 'elapsed': time.time() - start_time,
+                    'position': position})
+
+    while max_depth is None or limit < max_depth:
+        limit += 1
+        if table is not None:
+            table.new_iteration()
+        if position is not None:
+            per_depth = position['per_depth']
+            nodes = position['nodes']
+            peak = position['peak']
+            deepest = position['deepest']
+            path = position['path']
+            stack, states = resume_stack(start, blank, path, puzzle)
+            position = None
+        else:
+            if saver is not None and saver.due():
+                save()
+            per_depth = [0] * (limit + 1)
+            per_depth[0] = 1
+            nodes = 1
+            peak = 0
+            deepest = 0
+            path = []
+            states = [start]
+            stack = [successors(start, blank, None, puzzle)]
+        while stack:
+            step = next(stack[-1], None)
+            if step is None:
+                stack.pop()
+                state = states.pop()
+                if table is not None:
+                    table.store(state, len(stack), limit - len(stack) + 1) # no solution within the limit
+                if path:
+                    path.pop()
+                continue
+
+            child, target, direction = step
+            g = len(stack)
+            per_depth[g] += 1
+            if child in goals:
+                path.append(direction)
+                expanded_node += nodes
+                if stats is not None:
+                    stats.expanded = expanded_node
+                    stats.generated = generated + sum(per_depth) - 1
+                iterations.append(iteration_stats(limit, nodes, per_depth, peak, iterations))
+                if saver is not None:
+                    saver.remove()
+                return path, expanded_node, time.time() - start_time, max(memory_consumed, peak), iterations
+            if g == limit:
+                continue
+            if table is not None:
+                if table.probe(child, g) is not None:
+                    continue
+
+            path.append(direction)
+            states.append(child)
+            stack.append(successors(child, target, direction, puzzle))
+            nodes += 1
+            if not nodes % sample_every or len(stack) > deepest:
+                deepest = max(deepest, len(stack))
+                peak = max(peak, sys.getsizeof(stack) + sys.getsizeof(states) + sys.getsizeof(path)
+                           + len(stack) * sys.getsizeof(stack[-1]))
+                if stats is not None:
+                    stats.expanded = expanded_node + nodes
+                    stats.generated = generated + sum(per_depth) - 1
+                    stats.sample(len(stack))
+                if ((node_limit is not None and expanded_node + nodes - run_expanded > node_limit)
+                        or (time_limit is not None and time.time() - run_start > time_limit)):
+                    if saver is not None:
+                        # stopped right after stepping down path, resume_stack rebuilds the search
+                        save({'path': path, 'nodes': nodes, 'per_depth': per_depth, 'peak': peak,
+                              'deepest': deepest})
+                    return None
+
+        expanded_node += nodes
+        generated += sum(per_depth) - 1
+        if stats is not None:
+            stats.expanded = expanded_node
+            stats.generated = generated
+        memory_consumed = max(memory_consumed, peak)
+        iterations.append(iteration_stats(limit, nodes, per_depth, peak, iterations))
+    if saver is not None:
+        saver.remove()
+    return None
+
+
+def iteration_stats(limit, nodes, per_depth, memory, previous):
+    return {
+        'depth': limit,
+        'nodes': nodes,
+        'per_depth': per_depth,
+        'branching': nodes / previous[-1]['nodes'] if previous else None,
+        'memory': memory,
+    }
@@ -0,0 +1,256 @@
+import hashlib
+import mmap
+import os
+from collections import deque
+
+from .domain import get_puzzle
+
+# Disjoint additive pattern databases.
+# A pattern is a group of tiles; its database stores, for every placement of those tiles,
+# the minimum number of moves of pattern tiles needed to bring them to their goal cells
+# (moves of the other tiles are free). Because the groups are disjoint and only their own
+# moves are counted, the values of all groups of a partition can be added and the sum is
+# still an admissible, consistent heuristic.
+#
+# A placement of k tiles on n cells is stored at its partial permutation rank, so every
+# database is a byte array of n!/(n-k)! entries. Databases are written once to the cache
+# directory and memory mapped on later runs. size is a board width or a
+# sliding_puzzle.domain.Puzzle; databases for a custom goal layout are cached under a name
+# that includes a digest of the layout.
+#
+# Building is slow in pure Python (a 5 tile pattern of the 15-puzzle takes minutes), so it
+# never happens inside a search: databases are built offline with
+#
+#   python -m sliding_puzzle.build --size 4 --partition 555
+#
+# and a search whose tables are not in the cache fails at once with MissingPatternDatabase.
+# A build needs about n!/(n-k-1)! bytes for its cost table; patterns above MAX_BUILD_BYTES
+# (SLIDING_PUZZLE_PDB_MEMORY, 1 GiB by default) are refused.
+
+# (width, height) -> partition name -> patterns
+PARTITIONS = {
+    (3, 3): {
+        '44': ((1, 2, 3, 4), (5, 6, 7, 8)),
+        '8': ((1, 2, 3, 4, 5, 6, 7, 8),),
+    },
+    (4, 4): {
+        '555': ((1, 2, 3, 5, 6), (4, 7, 8, 11, 12), (9, 10, 13, 14, 15)),
+        '663': ((1, 5, 6, 9, 10, 13), (7, 8, 11, 12, 14, 15), (2, 3, 4)),
+        '78': ((1, 2, 3, 4, 5, 6, 7), (8, 9, 10, 11, 12, 13, 14, 15)),
+    },
+    (5, 5): {
+        '444444': ((1, 2, 6, 7), (3, 4, 5, 8), (9, 10, 14, 15), (11, 12, 16, 17), (13, 18, 19, 20),
+                   (21, 22, 23, 24)),
+        '6666': ((1, 2, 3, 6, 7, 8), (4, 5, 9, 10, 14, 15), (11, 12, 16, 17, 21, 22), (13, 18, 19, 20, 23, 24)),
+    },
+}
+
+# partitions whose databases can be built within the default memory limit
+DEFAULT_PARTITION = {(3, 3): '44', (4, 4): '555', (5, 5): '444444'}
+
+UNKNOWN = 255
+
+MAX_BUILD_BYTES = int(os.environ.get('SLIDING_PUZZLE_PDB_MEMORY', 1 << 30))
+
+
+# Raised when a search needs a database that has not been built yet
+class MissingPatternDatabase(LookupError):
+    pass
+
+
+def cache_dir():
+    return os.environ.get('SLIDING_PUZZLE_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'sliding_puzzle'))
+
+
+# Rank of a sequence of distinct cells among all ordered selections of len(cells) out of n cells
+def rank(cells, n):
+    r = 0
+    used = 0
+    for i, cell in enumerate(cells):
+        r = r * (n - i) + cell - (used & ((1 << cell) - 1)).bit_count()
+        used |= 1 << cell
+    return r
+
+
+def table_size(k, n):
+    size = 1
+    for i in range(k):
+        size *= n - i
+    return size
+
+
+# Bytes of the database and cost table of a build (the queue comes on top)
+def build_bytes(k, n):
+    return table_size(k, n) + table_size(k + 1, n)
+
+
+# Retrograde breadth first search from the goal placement of the pattern tiles.
+# The abstract state is the cells of the pattern tiles plus the empty cell, packed as
+# nibbles (empty cell in the lowest nibble). Moving a pattern tile costs 1 and moving any
+# other tile costs 0, so a 0-1 BFS (deque, cost 0 successors pushed to the front) visits
+# states in order of cost. The database keeps the cheapest cost over all empty cells.
+def build(pattern, size=4):
+    puzzle = get_puzzle(size)
+    if len(puzzle.goals) > 1:
+        raise ValueError("pattern databases are built for one goal, %r has several" % puzzle)
+    n = puzzle.cells
+    k = len(pattern)
+    if build_bytes(k, n) > MAX_BUILD_BYTES:
+        raise ValueError("a %d tile pattern database of a %dx%d puzzle needs %d bytes to build, more than the "
+                         "limit of %d (SLIDING_PUZZLE_PDB_MEMORY)" % ((k,) + puzzle.shape + (build_bytes(k, n),
+                                                                                              MAX_BUILD_BYTES)))
+    bits = puzzle.bits
+    mask = puzzle.mask
+    neighbours = [tuple(target for target, direction in moves) for moves in puzzle.moves]
+
+    table = bytearray([UNKNOWN]) * table_size(k, n)
+    dist = bytearray([UNKNOWN]) * table_size(k + 1, n)
+    goal = puzzle.goal_positions[0]
+    for j, tile in enumerate(pattern):
+        goal |= puzzle.goal_positions[tile] << (bits * (j + 1))
+
+    def cells_of(state):
+        return [(state >> (bits * i)) & mask for i in range(k + 1)]
+
+    dist[rank(cells_of(goal), n)] = 0
+    queue = deque([(goal, 0)])
+    while queue:
+        state, cost = queue.popleft()
+        cells = cells_of(state)
+        if cost > dist[rank(cells, n)]:
+            continue
+        pattern_rank = rank(cells[1:], n)
+        if table[pattern_rank] == UNKNOWN:
+            table[pattern_rank] = cost
+
+        blank = cells[0]
+        for target in neighbours[blank]:
+            if target in cells:
+                # a pattern tile slides into the empty cell
+                j = cells.index(target)
+                child = state - (target << (bits * j)) + (blank << (bits * j)) - blank + target
+                child_cost = cost + 1
+            else:
+                child = state - blank + target
+                child_cost = cost
+            child_rank = rank(cells_of(child), n)
+            if child_cost < dist[child_rank]:
+                dist[child_rank] = child_cost
+                if child_cost == cost:
+                    queue.appendleft((child, child_cost))
+                else:
+                    queue.append((child, child_cost))
+    return table
+
+
+def pattern_path(pattern, size=4, directory=None):
+    puzzle = get_puzzle(size)
+    shape = '%dx%d' % puzzle.shape
+    if not puzzle.standard_goal:
+        shape += '-goal' + hashlib.sha1(' '.join(map(str, puzzle.goal_tiles)).encode()).hexdigest()[:12]
+    name = 'pdb-%s-%s.bin' % (shape, '_'.join(str(tile) for tile in pattern))
+    return os.path.join(directory or cache_dir(), name)
+
+
+# Builds the database of a pattern and saves it to the cache, unless it is there already
+def save(pattern, size=4, directory=None):
+    path = pattern_path(pattern, size, directory)
+    if not os.path.exists(path):
+        table = build(pattern, size)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(table)
+        os.replace(tmp_path, path)
+    return path
+
+
+# The command line that builds a partition (see sliding_puzzle.build)
+def build_command(size=4, partition=None, directory=None):
+    puzzle = get_puzzle(size)
+    command = 'python -m sliding_puzzle.build --size %d' % puzzle.width
+    if puzzle.height != puzzle.width:
+        command += ' --height %d' % puzzle.height
+    if isinstance(partition, str):
+        command += ' --partition %s' % partition
+    if not puzzle.standard_goal:
+        command += " --goal '%s'" % ' '.join(map(str, puzzle.goal_tiles))
+    if directory is not None:
+        command += ' --directory %s' % directory
+    return command
+
+
+# Memory maps the cached database of a pattern; with build=False a missing one raises
+# MissingPatternDatabase instead of being built
+def load(pattern, size=4, directory=None, build=False):
+    path = pattern_path(pattern, size, directory)
+    if build:
+        save(pattern, size, directory)
+    elif not os.path.exists(path):
+        raise MissingPatternDatabase("pattern database %s is not built" % path)
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+# The patterns of a partition: a name from PARTITIONS, None for the default of the board
+# shape, or the patterns themselves
+def partition_patterns(puzzle, partition=None):
+    if partition is None:
+        partition = DEFAULT_PARTITION.get(puzzle.shape)
+    if isinstance(partition, str):
+        partition = PARTITIONS.get(puzzle.shape, {}).get(partition)
+    if partition is None:
+        raise ValueError("no pattern database partition for a %dx%d puzzle" % puzzle.shape)
+    return tuple(tuple(pattern) for pattern in partition)
+
+
+# Heuristic interface (see sliding_puzzle.heuristics) backed by an additive partition. The
+# databases must be in the cache unless build is true (see sliding_puzzle.build).
+class PatternDatabaseHeuristic:
+    name = 'pdb'
+
+    def __init__(self, size=4, partition=None, directory=None, build=False):
+        self.puzzle = puzzle = get_puzzle(size)
+        if len(puzzle.goals) > 1:
+            raise ValueError("pattern databases are built for one goal, %r has several" % puzzle)
+        self.cells = puzzle.cells
+        self.bits = puzzle.bits
+        self.mask = puzzle.mask
+        self.patterns = partition_patterns(puzzle, partition)
+        try:
+            self.tables = [load(pattern, puzzle, directory, build) for pattern in self.patterns]
+        except MissingPatternDatabase as e:
+            raise MissingPatternDatabase("%s, run: %s" % (e, build_command(puzzle, partition, directory))) from None
+        # tile -> index of the pattern containing it, or None for tiles outside the partition
+        self.pattern_of = [None] * self.cells
+        for p, pattern in enumerate(self.patterns):
+            for tile in pattern:
+                self.pattern_of[tile] = p
+
+    def tile_cells(self, state):
+        cell_of = [0] * self.cells
+        for i in range(self.cells):
+            cell_of[(state >> (self.bits * i)) & self.mask] = i
+        return cell_of
+
+    def evaluate(self, state):
+        cell_of = self.tile_cells(state)
+        n = self.cells
+        return sum(table[rank([cell_of[tile] for tile in pattern], n)]
+                   for pattern, table in zip(self.patterns, self.tables))
+
+    # Only the pattern containing the moved tile changes; state is the board after the move
+    def update(self, h, tile, source, dest, state):
+        p = self.pattern_of[tile]
+        if p is None:
+            return h
+        cell_of = self.tile_cells(state)
+        pattern = self.patterns[p]
+        table = self.tables[p]
+        after = [cell_of[t] for t in pattern]
+        before = [source if t == tile else cell_of[t] for t in pattern]
+        return h - table[rank(before, self.cells)] + table[rank(after, self.cells)]
+
+    def __call__(self, state):
+        return self.evaluate(state)
+
@@ -0,0 +1,278 @@
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import math
+import os
+import sys
+
+from .batch import ALGORITHMS, read_boards, solve_one
+from .heuristics import HEURISTICS
+from .validate import read_board
+
+# Asynchronous solver service.
+#
+#   python -m sliding_puzzle.service --port 8765 --workers 4 --algorithm idastar
+#   python -m sliding_puzzle.service --query boards.txt --port 8765
+#
+# Requests are queued on a bounded asyncio queue and dispatched to a process pool by one
+# task per worker; every result is the record of sliding_puzzle.batch.solve_one. When the
+# queue is full solve() waits for room (or, with wait=False, raises ServiceBusy), so
+# callers are slowed down instead of the queue growing without bound.
+#
+# Solved boards go into an LRU cache keyed by their canonical form. Under the default goal
+# transposing a square board about its main diagonal and relabelling every tile with the
+# goal tile of its transposed goal cell maps the goal onto itself, so a board and its
+# transpose have the same solution length, with U <-> L and D <-> R swapped. The canonical
+# form is the smaller of the two, and a cached solution is mapped back to the orientation
+# asked for. Requests for a board that is already queued or being solved wait for that
+# search instead of starting another one. With custom goals boards are only cached as is.
+#
+# Over TCP the service speaks JSON lines: a request is a board ("1 2 3 ...") or an object
+# {"board": "1 2 3 ..."}, the reply is the result record plus 'cached'.
+
+# move -> the same move on the transposed board
+TRANSPOSED_MOVES = {'U': 'L', 'L': 'U', 'D': 'R', 'R': 'D'}
+
+
+# Raised by solve(..., wait=False) when the request queue is full
+class ServiceBusy(Exception):
+    pass
+
+
+# Board transposed about the main diagonal, tiles relabelled so the default goal is fixed
+def transpose(tiles, width):
+    n = len(tiles)
+    relabel = [0] * n
+    for tile in range(1, n):
+        row, col = divmod(tile - 1, width)
+        relabel[tile] = col * width + row + 1
+    transposed = [0] * n
+    for cell, tile in enumerate(tiles):
+        row, col = divmod(cell, width)
+        transposed[col * width + row] = relabel[tile]
+    return transposed
+
+
+# (canonical tiles, whether they are the transpose of tiles)
+def canonical(tiles, width):
+    transposed = transpose(tiles, width)
+    if transposed < tiles:
+        return transposed, True
+    return tiles, False
+
+
+class SolverService:
+    def __init__(self, workers=None, algorithm='idastar', heuristic='manhattan', node_limit=None, time_limit=None,
+                 queue_size=64, cache_size=1024, goals=None, executor=None):
+        if algorithm not in ALGORITHMS:
+            raise ValueError("unknown algorithm %r, expected one of %s" % (algorithm, ', '.join(sorted(ALGORITHMS))))
+        if heuristic not in HEURISTICS:
+            raise ValueError("unknown heuristic %r, expected one of %s" % (heuristic, ', '.join(sorted(HEURISTICS))))
+        self.workers = workers or os.cpu_count() or 1
+        self.algorithm = algorithm
+        self.heuristic = heuristic
+        self.node_limit = node_limit
+        self.time_limit = time_limit
+        self.queue_size = queue_size
+        self.cache_size = cache_size
+        self.goals = goals
+        self.executor = executor
+        self._own_executor = False
+        self.cache = collections.OrderedDict() # canonical tiles -> solved record
+        self.pending = {} # canonical tiles -> future of the queued or running search
+        self.queue = None
+        self.tasks = []
+        self.hits = 0
+        self.misses = 0
+        self.joined = 0
+        self.rejected = 0
+
+    async def start(self):
+        self.queue = asyncio.Queue(self.queue_size)
+        if self.executor is None:
+            self._own_executor = True
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+        self.tasks = [asyncio.create_task(self.dispatch()) for _ in range(self.workers)]
+        return self
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        for future in self.pending.values():
+            if not future.done():
+                future.cancel()
+        self.pending.clear()
+        if self._own_executor:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    # Result record for a board. Invalid and unsolvable boards are answered at once.
+    async def solve(self, board, wait=True):
+        try:
+            tiles = read_board(board, goals=self.goals)
+        except ValueError:
+            # the record solve_one gives a board it cannot search, no search is started
+            return self.reply(solve_one(board, goals=self.goals), board, False, False)
+        transposed = False
+        if self.goals is None:
+            tiles, transposed = canonical(tiles, math.isqrt(len(tiles)))
+        key = tuple(tiles)
+
+        record = self.cache.get(key)
+        if record is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.reply(record, board, transposed, True)
+
+        future = self.pending.get(key)
+        if future is not None:
+            self.joined += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            if not wait and self.queue.full():
+                self.rejected += 1
+                raise ServiceBusy("solver queue is full (%d requests)" % self.queue_size)
+            self.misses += 1
+            self.pending[key] = future
+            try:
+                await self.queue.put((key, future))
+            except BaseException:
+                del self.pending[key]
+                future.cancel()
+                raise
+        record = await asyncio.shield(future)
+        return self.reply(record, board, transposed, False)
+
+    # Takes requests off the queue and runs them in the pool, one at a time
+    async def dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            key, future = await self.queue.get()
+            try:
+                record = await loop.run_in_executor(self.executor, solve_one, list(key), self.algorithm,
+                                                    self.heuristic, self.node_limit, self.time_limit, None, None,
+                                                    self.goals)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if record['status'] == 'solved':
+                    self.store(key, record)
+                if not future.done():
+                    future.set_result(record)
+            finally:
+                self.pending.pop(key, None)
+                self.queue.task_done()
+
+    def store(self, key, record):
+        self.cache[key] = record
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    # The record for the board as asked: its own text and, for a transposed board, the moves
+    # mapped back
+    def reply(self, record, board, transposed, cached):
+        record = dict(record)
+        record.pop('index', None)
+        record['board'] = board if isinstance(board, str) else ' '.join(map(str, board))
+        if transposed and 'moves' in record:
+            record['moves'] = ''.join(TRANSPOSED_MOVES[move] for move in record['moves'])
+        record['cached'] = cached
+        return record
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'joined': self.joined, 'rejected': self.rejected,
+                'queued': self.queue.qsize() if self.queue is not None else 0, 'running': len(self.pending),
+                'cached': len(self.cache)}
+
+
+# JSON lines over TCP, one reply per request line in order
+async def serve(service, host='127.0.0.1', port=8765):
+    async def handle(reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode().strip()
+                if not line:
+                    continue
+                if line.startswith('{'):
+                    try:
+                        board = json.loads(line).get('board', '')
+                    except ValueError:
+                        board = line
+                else:
+                    board = line
+                record = await service.solve(board)
+                writer.write((json.dumps(record) + '\n').encode())
+                await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+# Local client: sends boards to a running service and returns its replies
+async def query(boards, host='127.0.0.1', port=8765):
+    reader, writer = await asyncio.open_connection(host, port)
+    records = []
+    try:
+        for board in boards:
+            writer.write((json.dumps({'board': board}) + '\n').encode())
+            await writer.drain()
+            records.append(json.loads(await reader.readline()))
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sliding puzzle solver service (JSON lines over TCP)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--algorithm', default='idastar', choices=sorted(ALGORITHMS))
+    parser.add_argument('--heuristic', default='manhattan')
+    parser.add_argument('--node-limit', type=int, default=None, help="node budget per board")
+    parser.add_argument('--time-limit', type=float, default=None, help="seconds per board")
+    parser.add_argument('--queue-size', type=int, default=64, help="requests waiting before callers are held back")
+    parser.add_argument('--cache-size', type=int, default=1024, help="solved boards kept")
+    parser.add_argument('--query', help="send the boards of this file (- for stdin) to a running service")
+    args = parser.parse_args(argv)
+
+    if args.query:
+        source = sys.stdin if args.query == '-' else open(args.query)
+        try:
+            records = asyncio.run(query(list(read_boards(source)), args.host, args.port))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        for record in records:
+            print(json.dumps(record))
+        return
+
+    async def run():
+        async with SolverService(args.workers, args.algorithm, args.heuristic, args.node_limit, args.time_limit,
+                                 args.queue_size, args.cache_size) as service:
+            server = await serve(service, args.host, args.port)
+            async with server:
+                await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
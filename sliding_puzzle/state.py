@@ -0,0 +1,107 @@
+import math
+
+from .domain import cell_bits, get_puzzle
+
+# Packed board representation shared by the sliding puzzle solvers.
+# Every cell is stored in a fixed number of bits, 4 for up to 16 cells (cell i of the
+# 15-puzzle lives in bits 4*i .. 4*i+3) and more for larger boards (see
+# sliding_puzzle.domain), so a whole 15-puzzle board fits in a single 64 bit integer.
+# The integer itself is used as the hash key in visited/explored sets, no tuples are
+# ever built. The functions below take the number of cells of the board, 16 by default.
+
+# cell width of boards of up to 16 cells
+BITS = 4
+MASK = (1 << BITS) - 1
+
+
+# Packs a list of tiles ('1', '0', ... or ints) into one integer
+def pack(tiles):
+    bits = cell_bits(len(tiles))
+    state = 0
+    for i, tile in enumerate(tiles):
+        state |= int(tile) << (bits * i)
+    return state
+
+
+# Converts a packed state back to the list of strings format used by the solvers
+def unpack(state, cells=16):
+    bits = cell_bits(cells)
+    mask = (1 << bits) - 1
+    return [str((state >> (bits * i)) & mask) for i in range(cells)]
+
+
+def tile_at(state, idx, cells=16):
+    bits = cell_bits(cells)
+    return (state >> (bits * idx)) & ((1 << bits) - 1)
+
+
+def find_blank(state, cells=16):
+    bits = cell_bits(cells)
+    mask = (1 << bits) - 1
+    for i in range(cells):
+        if not (state >> (bits * i)) & mask:
+            return i
+    raise ValueError("board has no empty tile")
+
+
+# Slides the tile at index target into the empty cell at index blank.
+# The empty cell is always zero, so the swap is one subtraction and one addition.
+def slide(state, blank, target, cells=16):
+    bits = cell_bits(cells)
+    tile = (state >> (bits * target)) & ((1 << bits) - 1)
+    return state - (tile << (bits * target)) + (tile << (bits * blank))
+
+
+# Returns the index the empty tile moves to for a direction, or None if the move leaves the
+# board; a lookup in the size's precomputed move table (see sliding_puzzle.domain)
+def move_target(blank, direction, size=4):
+    return get_puzzle(size).targets[blank].get(direction)
+
+
+# Goal layout: tiles 1 .. n-1 in order followed by the empty tile
+def goal_state(size=4):
+    return get_puzzle(size).goal
+
+
+GOAL_TILES = ['1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '11', '12', '13', '14', '15', '0']
+GOAL = goal_state(4)
+
+
+# Immutable board: packed tiles plus the cached position of the empty tile. Packing and
+# moves go through the Puzzle of its size.
+class PackedBoard:
+    __slots__ = ('state', 'blank', 'size')
+
+    def __init__(self, state, blank, size=4):
+        self.state = state
+        self.blank = blank
+        self.size = size
+
+    @classmethod
+    def from_tiles(cls, tiles):
+        size = math.isqrt(len(tiles))
+        if size * size != len(tiles):
+            raise ValueError("PackedBoard needs a square board, got %d tiles" % len(tiles))
+        puzzle = get_puzzle(size)
+        state = puzzle.pack(tiles)
+        return cls(state, puzzle.find_blank(state), size)
+
+    def to_tiles(self):
+        return get_puzzle(self.size).unpack(self.state)
+
+    # Returns the board after moving the empty tile in direction, or None if the move is illegal
+    def move(self, direction):
+        puzzle = get_puzzle(self.size)
+        target = puzzle.move_target(self.blank, direction)
+        if target is None:
+            return None
+        return PackedBoard(puzzle.slide(self.state, self.blank, target), target, self.size)
+
+    def __eq__(self, other):
+        return self.state == other.state
+
+    def __hash__(self):
+        return hash(self.state)
+
+    def __repr__(self):
+        return 'PackedBoard(%s)' % ' '.join(self.to_tiles())
@@ -0,0 +1,127 @@
+import os
+import time
+import tracemalloc
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Instrumentation shared by the search engines.
+# Every engine takes an optional SearchStats. It times its phases ('setup' for heuristic
+# tables and start state, 'search', 'path' for rebuilding the moves), keeps the expanded
+# and generated node counts current, and calls sample() every few thousand expansions with
+# its frontier size (the open list for BFS and A*, the current path for the depth first
+# searches). sample() records the frontier over time and the memory high-water mark.
+#
+# Memory is measured with one of
+#   'rss'         - resident set size above its level at start(), sampled; cheap (uses
+#                   psutil when installed, /proc/self/statm otherwise)
+#   'tracemalloc' - peak of the Python allocations made since start(); exact, but slows
+#                   the search down several times
+#   None          - not measured
+
+MEMORY_MODES = ('rss', 'tracemalloc', None)
+
+
+def current_rss():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+class SearchStats:
+    def __init__(self, memory='rss'):
+        if memory not in MEMORY_MODES:
+            raise ValueError("unknown memory mode %r, expected one of %s" % (memory, ', '.join(map(str, MEMORY_MODES))))
+        self.memory = memory
+        self.expanded = 0
+        self.generated = 0
+        self.peak_memory = 0
+        self.max_frontier = 0
+        self.frontier = [] # (seconds since start, expanded nodes, frontier size)
+        self.phases = {} # phase name -> seconds
+        self.elapsed = 0.0
+        self._start = None
+        self._phase = None
+        self._phase_start = None
+        self._baseline = 0
+        self._tracing = False
+
+    def start(self):
+        self._start = time.perf_counter()
+        if self.memory == 'tracemalloc':
+            self._tracing = not tracemalloc.is_tracing()
+            if self._tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._baseline = tracemalloc.get_traced_memory()[0]
+        elif self.memory == 'rss':
+            self._baseline = current_rss()
+        return self
+
+    # Ends the current phase (if any) and starts timing the next one
+    def phase(self, name):
+        now = time.perf_counter()
+        if self._start is None:
+            self.start()
+        if self._phase is not None:
+            self.phases[self._phase] = self.phases.get(self._phase, 0.0) + now - self._phase_start
+        self._phase = name
+        self._phase_start = now
+
+    def sample(self, frontier_size):
+        self.frontier.append((time.perf_counter() - self._start, self.expanded, frontier_size))
+        if frontier_size > self.max_frontier:
+            self.max_frontier = frontier_size
+        self.measure_memory()
+
+    def measure_memory(self):
+        if self.memory == 'tracemalloc':
+            used = tracemalloc.get_traced_memory()[1] - self._baseline
+        elif self.memory == 'rss':
+            used = current_rss() - self._baseline
+        else:
+            return
+        if used > self.peak_memory:
+            self.peak_memory = used
+
+    # Closes the last phase, takes a final memory reading and fixes the elapsed time
+    def stop(self):
+        self.phase(None)
+        self.measure_memory()
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        self.elapsed = time.perf_counter() - self._start
+        return self
+
+    @property
+    def expansions_per_second(self):
+        return self.expanded / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def generations_per_second(self):
+        return self.generated / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'expanded': self.expanded,
+            'generated': self.generated,
+            'elapsed': self.elapsed,
+            'expansions_per_second': self.expansions_per_second,
+            'generations_per_second': self.generations_per_second,
+            'memory_mode': self.memory,
+            'peak_memory': self.peak_memory,
+            'max_frontier': self.max_frontier,
+            'frontier': [list(sample) for sample in self.frontier],
+            'phases': dict(self.phases),
+        }
+
+    def __repr__(self):
+        return ('SearchStats(expanded=%d, generated=%d, elapsed=%.3fs, peak_memory=%d)'
+                % (self.expanded, self.generated, self.elapsed, self.peak_memory))
@@ -0,0 +1,108 @@
+from array import array
+
+# Fixed size transposition table for the iterative deepening searches (IDDFS and IDA*).
+#
+# Every slot holds the packed state (its low 64 bits), the depth g it was searched from,
+# the iteration it was searched in and the bound that search returned (the next threshold
+# minus g). A state already searched in this iteration from the same or a smaller depth
+# had at least as much budget left then, so searching it again cannot find anything: it is
+# cut off and the search uses the stored bound instead.
+#
+# Entries are only used within their own iteration. The searches never try the move back
+# to the parent, so the bound is not a lower bound on the distance to the goal: reached
+# from another parent, in the same or a later iteration, the state may be closer than
+# that, and pruning with it loses optimal solutions.
+#
+# Memory is fixed at construction: the slots are parallel arrays of 13 bytes per entry.
+# Keys are exact for boards of up to 16 cells; larger boards keep 64 of their bits, so
+# a false match is possible but very unlikely.
+
+ENTRY_BYTES = 8 + 2 + 2 + 1
+KEY_MASK = (1 << 64) - 1
+GOLDEN = 0x9E3779B97F4A7C15
+
+POLICIES = ('depth-preferred', 'always-replace')
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=64, policy='depth-preferred'):
+        if policy not in POLICIES:
+            raise ValueError("unknown replacement policy %r, expected one of %s" % (policy, ', '.join(POLICIES)))
+        # a power of two number of slots, so the slot is taken from the top bits of the hash
+        self.bits = max(1, (int(size_mb * 2 ** 20) // ENTRY_BYTES).bit_length() - 1)
+        self.slots = 1 << self.bits
+        self.policy = policy
+        self.depth_preferred = policy == 'depth-preferred'
+        self.keys = array('Q', bytes(8 * self.slots))
+        self.depths = array('H', bytes(2 * self.slots))
+        self.iterations = array('H', bytes(2 * self.slots)) # 0 marks an empty slot
+        self.bounds = array('B', bytes(self.slots))
+        self.iteration = 0
+
+        self.probes = 0
+        self.hits = 0
+        self.cutoffs = 0
+        self.collisions = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def slot(self, state):
+        key = state & KEY_MASK
+        return key, ((key ^ (state >> 64)) * GOLDEN & KEY_MASK) >> (64 - self.bits)
+
+    # Called by the search at the start of every iteration
+    def new_iteration(self):
+        self.iteration = self.iteration % 0xFFFF + 1
+
+    # The stored bound if state was already searched this iteration from depth g or less
+    # (a cutoff), otherwise None
+    def probe(self, state, g):
+        self.probes += 1
+        key, i = self.slot(state)
+        if not self.iterations[i]:
+            return None
+        if self.keys[i] != key:
+            self.collisions += 1
+            return None
+        self.hits += 1
+        if self.iterations[i] == self.iteration and self.depths[i] <= g:
+            self.cutoffs += 1
+            return self.bounds[i]
+        return None
+
+    # Records that state was searched from depth g and returned bound (minus g)
+    def store(self, state, g, bound):
+        key, i = self.slot(state)
+        if self.iterations[i]:
+            if self.keys[i] == key:
+                # the search from the smaller depth had the larger budget
+                if self.iterations[i] == self.iteration and self.depths[i] < g:
+                    return
+            else:
+                # keep the entry from the shallower (larger) subtree unless it is stale
+                if (self.depth_preferred and self.iterations[i] == self.iteration
+                        and self.depths[i] < g):
+                    return
+                self.overwrites += 1
+        self.stores += 1
+        self.keys[i] = key
+        self.depths[i] = min(g, 0xFFFF)
+        self.iterations[i] = self.iteration
+        self.bounds[i] = min(bound, 0xFF)
+
+    def clear(self):
+        self.iterations = array('H', bytes(2 * self.slots))
+        self.iteration = 0
+
+    def stats(self):
+        return {
+            'slots': self.slots,
+            'bytes': self.slots * ENTRY_BYTES,
+            'policy': self.policy,
+            'probes': self.probes,
+            'hits': self.hits,
+            'cutoffs': self.cutoffs,
+            'collisions': self.collisions,
+            'stores': self.stores,
+            'overwrites': self.overwrites,
+        }
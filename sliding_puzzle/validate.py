@@ -0,0 +1,77 @@
+import math
+
+from .domain import goal_layouts
+
+
+class InvalidBoardError(ValueError):
+    pass
+
+
+# Raised for boards that cannot reach the goal: half of all tile arrangements are in
+# the other parity class and no sequence of moves connects the two classes
+class UnsolvableBoardError(ValueError):
+    pass
+
+
+# Parses "1 0 2 4 5 7 3 8 9 6 11 12 13 10 14 15" (or a list of tiles) into a list of ints
+# and checks that it is a square board (or rows of width tiles) holding every tile
+# 0 .. n-1 exactly once
+def parse_board(board, width=None):
+    if isinstance(board, str):
+        board = board.split()
+    try:
+        tiles = [int(tile) for tile in board]
+    except ValueError:
+        raise InvalidBoardError("board must contain only integers: %r" % (board,))
+    if width is not None:
+        if width < 2 or len(tiles) % width or len(tiles) < 2 * width:
+            raise InvalidBoardError("board has %d tiles, expected at least two rows of %d" % (len(tiles), width))
+    else:
+        size = int(math.isqrt(len(tiles)))
+        if size < 2 or size * size != len(tiles):
+            raise InvalidBoardError("board has %d tiles, expected a square number of at least 4" % len(tiles))
+    if sorted(tiles) != list(range(len(tiles))):
+        raise InvalidBoardError("board must contain each of the tiles 0 .. %d exactly once" % (len(tiles) - 1))
+    return tiles
+
+
+def inversions(tiles):
+    order = [tile for tile in tiles if tile]
+    count = 0
+    for i, tile in enumerate(order):
+        for other in order[i + 1:]:
+            if other < tile:
+                count += 1
+    return count
+
+
+# Parity invariant of a board: no move changes it, so two boards are connected exactly
+# when their values match. On odd widths every move keeps the inversion parity. On even
+# widths a vertical move flips the inversion parity and the empty tile's row parity
+# together, so their sum keeps its parity.
+def parity(tiles, width=None):
+    tiles = [int(tile) for tile in tiles]
+    if width is None:
+        width = int(math.isqrt(len(tiles)))
+    count = inversions(tiles)
+    if width % 2:
+        return count % 2
+    return (count + tiles.index(0) // width) % 2
+
+
+# Parity test against the goals (see sliding_puzzle.domain.goal_layouts), by default tiles
+# in order with the empty tile in the last cell: no inversions, empty tile in row height - 1
+def is_solvable(tiles, width=None, goals=None):
+    tiles = [int(tile) for tile in tiles]
+    if width is None:
+        width = int(math.isqrt(len(tiles)))
+    value = parity(tiles, width)
+    return any(parity(goal, width) == value for goal in goal_layouts(goals, len(tiles)))
+
+
+# parse_board followed by the solvability check, used by every solver before searching
+def read_board(board, width=None, goals=None):
+    tiles = parse_board(board, width)
+    if not is_solvable(tiles, width, goals):
+        raise UnsolvableBoardError("board %s cannot reach the goal state" % ' '.join(map(str, tiles)))
+    return tiles
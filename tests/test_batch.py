@@ -0,0 +1,15 @@
+from sliding_puzzle.batch import solve_one
+
+
+def test_engine_error_is_a_record(tmp_path, monkeypatch):
+    # no pattern database in the cache: the heuristic cannot be built
+    monkeypatch.setenv('SLIDING_PUZZLE_CACHE', str(tmp_path))
+    record = solve_one('1 2 3 4 5 6 7 8 9 10 11 12 13 14 0 15', 'idastar', 'pdb')
+    assert record['status'] == 'error'
+    assert record['error'].startswith('MissingPatternDatabase')
+
+
+def test_solved_record():
+    record = solve_one('1 2 3 4 5 6 7 8 9 10 11 12 13 14 0 15', 'idastar', 'manhattan')
+    assert record['status'] == 'solved'
+    assert record['moves'] == 'R'
@@ -0,0 +1,32 @@
+from sliding_puzzle.benchmark import (KORF100, check_optimal, compare, korf_instances, korf_lengths, make_baseline,
+                                      run_benchmark, unsolved_groups)
+from sliding_puzzle.validate import is_solvable
+
+
+def test_korf100_instances():
+    instances = korf_instances()
+    assert len(instances) == 100
+    for name, tier, tiles in instances:
+        assert sorted(tiles) == list(range(16))
+        assert is_solvable(tiles), name
+    # published mean optimal length of the set
+    assert sum(length for _, length in KORF100) == 5305
+
+
+def test_korf_lengths_checked():
+    # instance 55, the easiest of the set at 41 moves
+    instances = [instance for instance in korf_instances() if instance[0] == 'korf-55']
+    results = run_benchmark(instances, ['idastar:linear conflict'], optimal=korf_lengths())
+    assert results[0]['length'] == results[0]['optimal'] == 41
+    assert check_optimal(results) == []
+    results[0]['length'] = 43
+    assert check_optimal(results) == ['idastar:linear conflict|korf-55: solution length 43, optimal 41']
+
+
+def test_unsolved_baseline_is_a_regression():
+    instances = [instance for instance in korf_instances() if instance[0] == 'korf-1']
+    results = run_benchmark(instances, ['idastar:manhattan'], node_limit=1000)
+    assert results[0]['status'] == 'budget exceeded'
+    assert unsolved_groups(results) == [('idastar:manhattan', 'korf', 1)]
+    assert compare(results, make_baseline(results)) == [
+        'the baseline solved none of these runs, there is nothing to compare against']
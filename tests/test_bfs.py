@@ -0,0 +1,15 @@
+from sliding_puzzle.bfs import breadth_first_search
+from sliding_puzzle.domain import get_puzzle
+
+
+def test_exhausted_frontier_returns_none():
+    # tiles 1 and 2 swapped: the other parity class, the goal is never reached
+    puzzle = get_puzzle(2)
+    assert breadth_first_search(puzzle.pack([2, 1, 3, 0]), 2) is None
+
+
+def test_finds_shortest_path():
+    puzzle = get_puzzle(3)
+    path, expanded, _, _ = breadth_first_search(puzzle.pack([1, 2, 3, 4, 5, 6, 0, 7, 8]), 3)
+    assert path == ['R', 'R']
+    assert expanded > 0
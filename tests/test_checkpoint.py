@@ -0,0 +1,34 @@
+from sliding_puzzle.benchmark import random_walk
+from sliding_puzzle.idastar import idastar
+from sliding_puzzle.iddfs import iddfs
+
+
+def resume_until_solved(search, checkpoint, calls=1000):
+    for _ in range(calls):
+        result = search(checkpoint)
+        if result is not None:
+            return result
+    raise AssertionError("no solution after %d resumed calls" % calls)
+
+
+def test_idastar_resumes_within_an_iteration(tmp_path):
+    # a budget much smaller than one iteration still makes progress on every call
+    start = random_walk(40, 4, 1)
+    full = idastar(start, 'manhattan', 4)
+    resumed = resume_until_solved(
+        lambda checkpoint: idastar(start, 'manhattan', 4, node_limit=50, checkpoint=checkpoint),
+        str(tmp_path / 'idastar.ckpt'))
+    assert resumed[0] == full[0]
+    assert resumed[1] == full[1]
+    assert resumed[4] == full[4]
+
+
+def test_iddfs_resumes_within_an_iteration(tmp_path):
+    start = random_walk(12, 4, 0)
+    full = iddfs(start, 4)
+    resumed = resume_until_solved(
+        lambda checkpoint: iddfs(start, 4, node_limit=2000, checkpoint=checkpoint),
+        str(tmp_path / 'iddfs.ckpt'))
+    assert resumed[0] == full[0]
+    assert resumed[1] == full[1]
+    assert [iteration['nodes'] for iteration in resumed[4]] == [iteration['nodes'] for iteration in full[4]]
@@ -0,0 +1,10 @@
+from sliding_puzzle import PackedBoard, pack, unpack
+
+
+def test_packed_board_24_puzzle():
+    tiles = [str(tile) for tile in list(range(1, 25)) + [0]]
+    board = PackedBoard.from_tiles(tiles)
+    assert board.to_tiles() == tiles
+    assert unpack(pack(tiles), 25) == tiles
+    assert board.move('U').to_tiles()[-6:] == ['0', '21', '22', '23', '24', '20']
+    assert board.move('R') is None
@@ -0,0 +1,43 @@
+import random
+
+import pytest
+
+from sliding_puzzle.bfs import breadth_first_search
+from sliding_puzzle.domain import get_puzzle
+from sliding_puzzle.idastar import idastar
+from sliding_puzzle.transposition import TranspositionTable
+from sliding_puzzle.validate import is_solvable
+
+
+def random_boards(puzzle, count, seed):
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < count:
+        tiles = list(range(puzzle.cells))
+        rng.shuffle(tiles)
+        if is_solvable(tiles, puzzle.width):
+            boards.append(tiles)
+    return boards
+
+
+@pytest.mark.parametrize('tiles, heuristic', [
+    ([4, 7, 3, 6, 2, 1, 0, 5], 'manhattan'),
+    ([3, 4, 7, 2, 6, 5, 0, 1], 'misplaced'),
+    ([2, 3, 7, 0, 5, 6, 1, 4], 'manhattan'),
+])
+def test_idastar_table_optimal_2x4(tiles, heuristic):
+    # a tiny table, so states are stored and overwritten all the time
+    puzzle = get_puzzle(2, 4)
+    start = puzzle.pack(tiles)
+    path = idastar(start, heuristic, puzzle, table=TranspositionTable(0.01))[0]
+    assert len(path) == len(breadth_first_search(start, puzzle)[0])
+
+
+@pytest.mark.parametrize('width, height, count', [(2, 4, 12), (3, 3, 4)])
+@pytest.mark.parametrize('heuristic', ['manhattan', 'misplaced'])
+def test_idastar_table_matches_bfs(width, height, count, heuristic):
+    puzzle = get_puzzle(width, height)
+    for tiles in random_boards(puzzle, count, '%dx%d' % (width, height)):
+        start = puzzle.pack(tiles)
+        path = idastar(start, heuristic, puzzle, table=TranspositionTable(0.01))[0]
+        assert len(path) == len(breadth_first_search(start, puzzle)[0]), tiles